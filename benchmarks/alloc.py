@@ -0,0 +1,163 @@
+from argparse import ArgumentParser
+from collections.abc import Callable
+from gc import callbacks, collect
+from logging import getLogger, StreamHandler
+from os import remove, rmdir
+from os.path import abspath, dirname, join
+from sys import exit, getallocatedblocks, path, stdout
+from tempfile import mkdtemp
+from time import perf_counter
+from tracemalloc import start, stop, get_traced_memory
+from typing import Dict, Iterator
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from footprintotp.stream_cipher import StreamCipher, CHUNK_SIZE
+
+# Logger
+logger = getLogger("Benchmark")
+logger.setLevel("INFO")
+hdlr = StreamHandler(stdout)
+logger.addHandler(hdlr)
+
+
+def read_loop(
+    filename: str,
+    key_file: str,
+    out_file: str,
+    chunk_size: int
+) -> Iterator[int]:
+    """
+    Chunked XOR loop that allocates new bytes for every read and every XOR
+    result, kept as the "before" case of the benchmark
+
+    :param filename: Filename
+    :type filename: str
+    :param key_file: Key filename
+    :type key_file: str
+    :param out_file: Output filename
+    :type out_file: str
+    :param chunk_size: Number of bytes per chunk
+    :type chunk_size: int
+    :return: Number of bytes written so far
+    :rtype: Iterator[int]
+    """
+    done = 0
+    with open(filename, "rb") as m, open(key_file, "rb") as k, \
+            open(out_file, "wb") as o:
+        while True:
+            chunk = StreamCipher.xor(m.read(chunk_size), k.read(chunk_size))
+            if not chunk:
+                break
+            o.write(chunk)
+            done += len(chunk)
+            yield done
+
+
+def measure(
+    steps: Callable[[str, str, str, int], Iterator[int]],
+    filename: str,
+    key_file: str,
+    out_file: str,
+    chunk_size: int
+) -> Dict[str, float]:
+    """
+    Run a step generator to completion and record its allocation behavior
+
+    :param steps: Step generator
+    :type steps: Callable[[str, str, str, int], Iterator[int]]
+    :param filename: Filename
+    :type filename: str
+    :param key_file: Key filename
+    :type key_file: str
+    :param out_file: Output filename
+    :type out_file: str
+    :param chunk_size: Number of bytes per chunk
+    :type chunk_size: int
+    :return: Measurements
+    :rtype: Dict[str, float]
+    """
+    collections = [0, 0, 0]
+
+    def on_gc(phase: str, info: Dict[str, int]) -> None:
+        if phase == "start":
+            collections[info["generation"]] += 1
+
+    collect()
+    callbacks.append(on_gc)
+    blocks = getallocatedblocks()
+    start()
+    begin = perf_counter()
+    chunks = 0
+    done = 0
+    for done in steps(filename, key_file, out_file, chunk_size):
+        chunks += 1
+    elapsed = perf_counter() - begin
+    current, peak = get_traced_memory()
+    stop()
+    callbacks.remove(on_gc)
+    return {
+        "chunks": chunks,
+        "seconds": elapsed,
+        "mb_per_s": done / elapsed / 1e6 if elapsed else 0.0,
+        "traced_peak_bytes": peak,
+        "allocated_blocks_delta": getallocatedblocks() - blocks,
+        "gc_gen0": collections[0],
+        "gc_gen1": collections[1],
+        "gc_gen2": collections[2]
+    }
+
+
+def main() -> int:
+    """
+    Compare the allocating chunk loop with `StreamCipher._xor_stream`
+
+    :return: Return code
+    :rtype: int
+    """
+    parser = ArgumentParser(
+        prog="alloc.py",
+        description="Allocation and GC pressure of the XOR hot path"
+    )
+    parser.add_argument(
+        "--size",
+        action="store",
+        type=int,
+        help="Size of the generated file in bytes",
+        dest="SIZE",
+        default=1 << 30
+    )
+    parser.add_argument(
+        "--chunk-size",
+        action="store",
+        type=int,
+        help="Number of bytes per chunk",
+        dest="CHUNK_SIZE",
+        default=CHUNK_SIZE
+    )
+    args = parser.parse_args()
+    tmp = mkdtemp()
+    filename = join(tmp, "message")
+    key_file = join(tmp, "key")
+    out_file = join(tmp, "out")
+    # Sparse files are enough since the XOR cost does not depend on content
+    for name in (filename, key_file):
+        with open(name, "wb") as f:
+            f.truncate(args.SIZE)
+    cases = {
+        "before": read_loop,
+        "after": StreamCipher._xor_stream
+    }
+    for name, steps in cases.items():
+        result = measure(steps, filename, key_file, out_file, args.CHUNK_SIZE)
+        logger.info(f"{name}:")
+        for key, value in result.items():
+            logger.info(f"  {key}: {value}")
+    for name in (filename, key_file, out_file):
+        remove(name)
+    rmdir(tmp)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,103 @@
+from argparse import ArgumentParser
+from logging import getLogger, StreamHandler
+from os.path import abspath, dirname
+from subprocess import run
+from sys import executable, exit, stdout
+from typing import Dict, List, Tuple
+
+# Directory containing the footprintotp package
+ROOT = dirname(dirname(abspath(__file__)))
+# Modules the cipher must not load at import time
+HEAVY = ("gi", "platformdirs", "json", "textwrap", "base64")
+
+# Logger
+logger = getLogger("Benchmark")
+logger.setLevel("INFO")
+hdlr = StreamHandler(stdout)
+logger.addHandler(hdlr)
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """
+    Import `module` in a fresh interpreter and return the `-X importtime`
+    measurements of every module it loaded
+
+    :param module: Module name
+    :type module: str
+    :return: List of module name, self and cumulative microseconds
+    :rtype: List[Tuple[str, int, int]]
+    """
+    result = run(
+        [executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        times.append((name.strip(), int(own), int(cumulative)))
+    return times
+
+
+def main() -> int:
+    """
+    Report the import time of a package module and check that it does not
+    load the modules in `HEAVY`
+
+    :return: Return code
+    :rtype: int
+    """
+    parser = ArgumentParser(
+        prog="import_time.py",
+        description="Import time of the footprintotp package"
+    )
+    parser.add_argument(
+        "--module",
+        action="store",
+        help="Module to import",
+        dest="MODULE",
+        default="footprintotp.stream_cipher"
+    )
+    parser.add_argument(
+        "--runs",
+        action="store",
+        type=int,
+        help="Number of runs, the fastest is reported",
+        dest="RUNS",
+        default=5
+    )
+    parser.add_argument(
+        "--top",
+        action="store",
+        type=int,
+        help="Number of slowest modules to list",
+        dest="TOP",
+        default=10
+    )
+    args = parser.parse_args()
+    runs = [import_times(args.MODULE) for _ in range(args.RUNS)]
+    best: Dict[str, int] = {}
+    for times in runs:
+        for name, own, cumulative in times:
+            if name not in best or own < best[name]:
+                best[name] = own
+    total = min(
+        cumulative for times in runs
+        for name, _, cumulative in times if name == args.MODULE
+    )
+    logger.info(f"{args.MODULE}: {total / 1000:.2f} ms, {len(best)} modules")
+    for name, own in sorted(best.items(), key=lambda i: -i[1])[:args.TOP]:
+        logger.info(f"  {own / 1000:8.2f} ms  {name}")
+    loaded = [name for name in best if name.split(".")[0] in HEAVY]
+    if loaded:
+        logger.error(f"Loaded at import time: {', '.join(sorted(loaded))}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,591 @@
+from argparse import ArgumentParser
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from json import dumps, loads
+from logging import getLogger, StreamHandler
+from os import cpu_count, makedirs
+from os.path import abspath, dirname, exists, join
+from platform import platform, python_version
+from random import Random
+from shutil import rmtree
+from sys import exit, path, platform as sys_platform, stdout
+from tempfile import mkdtemp
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from footprintotp import __version__
+from footprintotp.log_store import LogStore
+from footprintotp.stream_cipher import StreamCipher, BACKENDS
+
+# Resource usage is not available on Windows
+try:
+    from resource import getrusage, RUSAGE_SELF, RUSAGE_CHILDREN
+except ImportError:
+    getrusage = None
+
+# Size suffixes accepted by --sizes
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+# Number of bytes a file case may process over all its runs, beyond which
+# it runs only once
+RUN_BUDGET = 1 << 30
+# Metrics compared against the baseline, with whether higher is better
+METRICS = {
+    "mb_per_s": True,
+    "ops_per_s": True,
+    "p50_ms": False,
+    "peak_rss_mb": False
+}
+
+# Logger
+logger = getLogger("Benchmark")
+logger.setLevel("INFO")
+hdlr = StreamHandler(stdout)
+logger.addHandler(hdlr)
+
+# Samples of one operation, as seconds per run and bytes or operations per
+# run
+Samples = Tuple[List[float], int, str]
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse a size such as "1K", "100M" or "10G"
+
+    :param text: Size
+    :type text: str
+    :return: Number of bytes
+    :rtype: int
+    """
+    text = text.strip().upper()
+    if text[-1:] in UNITS:
+        return int(text[:-1]) * UNITS[text[-1]]
+    return int(text)
+
+
+def size_name(size: int) -> str:
+    """
+    Return the shortest name of `size` that `parse_size` reads back
+
+    :param size: Number of bytes
+    :type size: int
+    :return: Size name
+    :rtype: str
+    """
+    for unit, factor in sorted(UNITS.items(), key=lambda u: -u[1]):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def sparse(filename: str, size: int) -> None:
+    """
+    Create a sparse file of `size` bytes
+
+    The XOR cost does not depend on content, so sparse inputs measure the
+    cipher without spending disk space or time generating them.
+
+    :param filename: Filename
+    :type filename: str
+    :param size: Number of bytes
+    :type size: int
+    """
+    with open(filename, "wb") as f:
+        f.truncate(size)
+
+
+def timed(func: Callable[[], object]) -> float:
+    """
+    Return the number of seconds `func` takes
+
+    :param func: Function
+    :type func: Callable[[], object]
+    :return: Seconds
+    :rtype: float
+    """
+    start = perf_counter()
+    func()
+    return perf_counter() - start
+
+
+def bench_xor(tmp: str, size: int, runs: int) -> Dict[str, Samples]:
+    """
+    Time `StreamCipher.xor` on in-memory messages of `size` bytes
+
+    :param tmp: Scratch directory
+    :type tmp: str
+    :param size: Number of bytes
+    :type size: int
+    :param runs: Number of runs
+    :type runs: int
+    :return: Samples by operation
+    :rtype: Dict[str, Samples]
+    """
+    message = bytes(size)
+    key = bytes(size)
+    samples = [
+        timed(lambda: StreamCipher.xor(message, key)) for _ in range(runs)
+    ]
+    return {"xor": (samples, size, "bytes")}
+
+
+def bench_file(
+    tmp: str,
+    size: int,
+    runs: int,
+    backend: str,
+    workers: int
+) -> Dict[str, Samples]:
+    """
+    Time `StreamCipher.encrypt_file` and `StreamCipher.decrypt_file` on a
+    sparse file of `size` bytes, removing the outputs after every run
+
+    :param tmp: Scratch directory
+    :type tmp: str
+    :param size: Number of bytes
+    :type size: int
+    :param runs: Number of runs
+    :type runs: int
+    :param backend: XOR backend
+    :type backend: str
+    :param workers: Number of XOR worker processes
+    :type workers: int
+    :return: Samples by operation
+    :rtype: Dict[str, Samples]
+    """
+    filename = join(tmp, "message")
+    key_file = join(tmp, "key")
+    enc_dir = join(tmp, "enc")
+    dec_dir = join(tmp, "dec")
+    keys_dir = join(tmp, "keys")
+    sparse(filename, size)
+    sparse(key_file, size)
+    encrypt, decrypt = [], []
+    for _ in range(runs):
+        for d in (enc_dir, dec_dir, keys_dir):
+            makedirs(d, exist_ok=True)
+        start = perf_counter()
+        enc_file, key_filename = StreamCipher.encrypt_file(
+            filename,
+            key_file,
+            enc_dir,
+            keys_dir,
+            tmp,
+            enc_names=True,
+            backend=backend,
+            workers=workers
+        )
+        encrypt.append(perf_counter() - start)
+        decrypt.append(timed(lambda: StreamCipher.decrypt_file(
+            enc_file,
+            key_filename,
+            dec_dir,
+            tmp,
+            del_toggle=True,
+            backend=backend,
+            workers=workers
+        )))
+        for d in (enc_dir, dec_dir, keys_dir):
+            rmtree(d)
+    return {
+        "encrypt": (encrypt, size, "bytes"),
+        "decrypt": (decrypt, size, "bytes")
+    }
+
+
+def bench_batch(tmp: str, files: int, runs: int) -> Dict[str, Samples]:
+    """
+    Time `StreamCipher.encrypt_tree` and `StreamCipher.decrypt_tree` on a
+    directory of `files` files of 1 KB each
+
+    :param tmp: Scratch directory
+    :type tmp: str
+    :param files: Number of files
+    :type files: int
+    :param runs: Number of runs
+    :type runs: int
+    :return: Samples by operation
+    :rtype: Dict[str, Samples]
+    """
+    src_dir = join(tmp, "src")
+    enc_dir = join(tmp, "enc")
+    dec_dir = join(tmp, "dec")
+    keys_dir = join(tmp, "keys")
+    makedirs(src_dir)
+    for i in range(files):
+        with open(join(src_dir, f"file{i:06d}"), "wb") as f:
+            f.write(bytes(1 << 10))
+    encrypt, decrypt = [], []
+    for _ in range(runs):
+        for d in (enc_dir, dec_dir, keys_dir):
+            makedirs(d, exist_ok=True)
+        encrypt.append(timed(lambda: StreamCipher.encrypt_tree(
+            src_dir, enc_dir, keys_dir, tmp, enc_names=True
+        )))
+        decrypt.append(timed(lambda: StreamCipher.decrypt_tree(
+            enc_dir, dec_dir, tmp, del_toggle=True
+        )))
+        for d in (enc_dir, dec_dir, keys_dir):
+            rmtree(d)
+    return {
+        "encrypt_tree": (encrypt, files, "ops"),
+        "decrypt_tree": (decrypt, files, "ops")
+    }
+
+
+def bench_log(
+    tmp: str,
+    entries: int,
+    runs: int,
+    seed: int
+) -> Dict[str, Samples]:
+    """
+    Time lookups, appends, removals and listing on a log holding `entries`
+    entries
+
+    The first lookup, made before the process has touched the log, is
+    reported on its own as "find_cold".
+
+    :param tmp: Scratch directory
+    :type tmp: str
+    :param entries: Number of log entries
+    :type entries: int
+    :param runs: Number of runs of each operation
+    :type runs: int
+    :param seed: Random seed of the names looked up
+    :type seed: int
+    :return: Samples by operation
+    :rtype: Dict[str, Samples]
+    """
+    log = LogStore(tmp)
+    batch = 100000
+    for first in range(0, entries, batch):
+        log.append([
+            (f"/src/file{i}", f"/enc/enc{i}.otp", f"/keys/key{i}")
+            for i in range(first, min(first + batch, entries))
+        ])
+    rng = Random(seed)
+    names = [
+        f"/enc/enc{rng.randrange(entries)}.otp" if entries
+        else "/enc/missing.otp"
+        for _ in range(runs)
+    ]
+    find_cold = [timed(lambda: log.find(names[0]))]
+    find = [timed(lambda: log.find(name)) for name in names]
+    append, remove = [], []
+    for i in range(runs):
+        entry = (f"/src/new{i}", f"/enc/new{i}.otp", f"/keys/new{i}")
+        append.append(timed(lambda: log.append([entry])))
+        remove.append(timed(lambda: log.remove([entry[1]])))
+    count = [timed(log.count) for _ in range(min(runs, 10))]
+    # A page reached by position rather than from the page before it
+    page = [
+        timed(lambda: log.page(100, entries // 2))
+        for _ in range(min(runs, 10))
+    ]
+    return {
+        "find_cold": (find_cold, 1, "ops"),
+        "find": (find, 1, "ops"),
+        "append": (append, 1, "ops"),
+        "remove": (remove, 1, "ops"),
+        "count": (count, 1, "ops"),
+        "page": (page, 1, "ops")
+    }
+
+
+def peak_rss() -> Optional[float]:
+    """
+    Return the peak resident set size of this process and its children
+
+    :return: Megabytes, or None where it cannot be measured
+    :rtype: Optional[float]
+    """
+    if getrusage is None:
+        return None
+    peak = max(getrusage(RUSAGE_SELF).ru_maxrss,
+               getrusage(RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports kilobytes and macOS bytes
+    if sys_platform == "darwin":
+        return peak / (1 << 20)
+    return peak / (1 << 10)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """
+    Return the `q` quantile of `samples` by linear interpolation
+
+    :param samples: Samples
+    :type samples: List[float]
+    :param q: Quantile between 0 and 1
+    :type q: float
+    :return: Quantile
+    :rtype: float
+    """
+    ordered = sorted(samples)
+    pos = (len(ordered) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def run_case(
+    bench: Callable[..., Dict[str, Samples]],
+    args: tuple
+) -> Tuple[Dict[str, Dict[str, float]], Optional[float]]:
+    """
+    Run one benchmark in a scratch directory and summarize its samples
+
+    Called in a fresh worker process, so the peak RSS is that of the case.
+
+    :param bench: Benchmark function
+    :type bench: Callable[..., Dict[str, Samples]]
+    :param args: Arguments after the scratch directory
+    :type args: tuple
+    :return: Summary by operation, and peak RSS in megabytes
+    :rtype: Tuple[Dict[str, Dict[str, float]], Optional[float]]
+    """
+    tmp = mkdtemp()
+    try:
+        samples = bench(tmp, *args)
+    finally:
+        rmtree(tmp, ignore_errors=True)
+    summary = {}
+    for op, (seconds, amount, unit) in samples.items():
+        median = percentile(seconds, 0.5)
+        result = {
+            "runs": len(seconds),
+            "p50_ms": median * 1000,
+            "p90_ms": percentile(seconds, 0.9) * 1000,
+            "p99_ms": percentile(seconds, 0.99) * 1000
+        }
+        # Rates follow the median run, so one slow run does not skew them
+        rate = amount / median if median else 0.0
+        if unit == "bytes":
+            result["mb_per_s"] = rate / 1e6
+        else:
+            result["ops_per_s"] = rate
+        summary[op] = result
+    return summary, peak_rss()
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float
+) -> List[str]:
+    """
+    Return the metrics of `results` that are worse than in `baseline` by
+    more than `tolerance`
+
+    :param results: Results by case
+    :type results: Dict[str, Dict[str, float]]
+    :param baseline: Baseline results by case
+    :type baseline: Dict[str, Dict[str, float]]
+    :param tolerance: Allowed relative change
+    :type tolerance: float
+    :return: Descriptions of regressions
+    :rtype: List[str]
+    """
+    regressions = []
+    for case in sorted(results.keys() & baseline.keys()):
+        for metric, higher in METRICS.items():
+            new = results[case].get(metric)
+            old = baseline[case].get(metric)
+            if not new or not old:
+                continue
+            change = new / old - 1
+            if (-change if higher else change) > tolerance:
+                regressions.append(
+                    f"{case} {metric}: {old:.3f} -> {new:.3f} "
+                    f"({change * 100:+.1f}%)"
+                )
+    return regressions
+
+
+def main() -> int:
+    """
+    Run the benchmark suite, write the results as JSON and compare them
+    against a baseline
+
+    Without `--update-baseline`, a missing baseline is an error rather
+    than a pass, and so is a baseline that shares no case with the run.
+
+    :return: Return code, 1 when a metric regressed or nothing could be
+        compared
+    :rtype: int
+    """
+    parser = ArgumentParser(
+        prog="suite.py",
+        description="Benchmarks of the cipher and the file log"
+    )
+    parser.add_argument(
+        "--sizes",
+        action="store",
+        help="Comma separated file sizes, with optional K, M or G suffix",
+        dest="SIZES",
+        default="1K,1M,100M,1G,10G"
+    )
+    parser.add_argument(
+        "--files",
+        action="store",
+        type=int,
+        help="Number of small files in the batch benchmark",
+        dest="FILES",
+        default=10000
+    )
+    parser.add_argument(
+        "--log-sizes",
+        action="store",
+        help="Comma separated numbers of log entries",
+        dest="LOG_SIZES",
+        default="0,1000,100000,1000000"
+    )
+    parser.add_argument(
+        "--runs",
+        action="store",
+        type=int,
+        help="Number of runs of each operation",
+        dest="RUNS",
+        default=20
+    )
+    parser.add_argument(
+        "--backend",
+        action="store",
+        choices=BACKENDS,
+        help="XOR backend of the file benchmarks",
+        dest="BACKEND",
+        default="auto"
+    )
+    parser.add_argument(
+        "--workers",
+        action="store",
+        type=int,
+        help="Number of XOR worker processes of the file benchmarks",
+        dest="WORKERS",
+        default=1
+    )
+    parser.add_argument(
+        "--only",
+        action="store",
+        help="Only run cases whose name starts with this prefix",
+        dest="ONLY",
+        default=""
+    )
+    parser.add_argument(
+        "--seed",
+        action="store",
+        type=int,
+        help="Random seed of the log lookups",
+        dest="SEED",
+        default=0
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        action="store",
+        help="JSON file to write the results to",
+        dest="OUTPUT",
+        default="bench.json"
+    )
+    parser.add_argument(
+        "--baseline",
+        action="store",
+        help="JSON results to compare against",
+        dest="BASELINE",
+        default=join(dirname(abspath(__file__)), "baseline.json")
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write the results to the baseline instead of comparing",
+        dest="UPDATE"
+    )
+    parser.add_argument(
+        "--tolerance",
+        action="store",
+        type=float,
+        help="Allowed relative change before a metric is a regression",
+        dest="TOLERANCE",
+        default=0.15
+    )
+    args = parser.parse_args()
+    # Checked before running, since a full run takes a long time
+    if not args.UPDATE and not exists(args.BASELINE):
+        parser.error(
+            f"no baseline at {args.BASELINE}, create one on this machine "
+            "with --update-baseline"
+        )
+
+    cases: Dict[str, Tuple[Callable[..., Dict[str, Samples]], tuple]] = {}
+    for size in map(parse_size, args.SIZES.split(",")):
+        runs = max(1, min(args.RUNS, RUN_BUDGET // size))
+        name = size_name(size)
+        # Messages are held in memory whole, so they stay small
+        if size <= 1 << 28:
+            cases[f"xor/{name}"] = (bench_xor, (size, runs))
+        cases[f"file/{name}"] = (
+            bench_file, (size, runs, args.BACKEND, args.WORKERS)
+        )
+    cases[f"batch/{args.FILES}"] = (
+        bench_batch, (args.FILES, min(args.RUNS, 3))
+    )
+    for entries in map(int, args.LOG_SIZES.split(",")):
+        cases[f"log/{entries}"] = (bench_log, (entries, args.RUNS, args.SEED))
+
+    results: Dict[str, Dict[str, float]] = {}
+    for case, (bench, bench_args) in cases.items():
+        if not case.startswith(args.ONLY):
+            continue
+        # A fresh process per case keeps each peak RSS to its own case
+        with ProcessPoolExecutor(1, max_tasks_per_child=1) as pool:
+            summary, rss = pool.submit(run_case, bench, bench_args).result()
+        for op, result in summary.items():
+            result["peak_rss_mb"] = rss
+            results[f"{case}/{op}"] = result
+            rate = (
+                f"{result['mb_per_s']:.1f} MB/s" if "mb_per_s" in result
+                else f"{result['ops_per_s']:.1f} ops/s"
+            )
+            logger.info(
+                f"{case}/{op}: {rate}, "
+                f"p50 {result['p50_ms']:.3f} ms, "
+                f"p99 {result['p99_ms']:.3f} ms, "
+                f"peak RSS {rss} MB"
+            )
+
+    report = {
+        "meta": {
+            "version": __version__,
+            "python": python_version(),
+            "platform": platform(),
+            "cpus": cpu_count(),
+            "args": vars(args)
+        },
+        "results": results
+    }
+    with open(args.OUTPUT, "w") as f:
+        f.write(dumps(report, indent=2))
+    logger.info(f"Results written to {args.OUTPUT}")
+
+    if args.UPDATE:
+        with open(args.BASELINE, "w") as f:
+            f.write(dumps(report, indent=2))
+        logger.info(f"Baseline written to {args.BASELINE}")
+        return 0
+    with open(args.BASELINE, "r") as f:
+        baseline = loads(f.read())["results"]
+    if not results.keys() & baseline.keys():
+        logger.error("The baseline has none of the cases run")
+        return 1
+    regressions = compare(results, baseline, args.TOLERANCE)
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    if regressions:
+        return 1
+    logger.info("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
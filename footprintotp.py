@@ -1,5 +1,16 @@
-from sys import argv
-from footprintotp.main import main
+import sys
+from sys import argv, exit
 
 if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        # Needed by the parallel XOR backend in frozen builds, and only
+        # imported there since multiprocessing slows every start down
+        from multiprocessing import freeze_support
+        freeze_support()
+    from footprintotp.cli import COMMANDS
+    if len(argv) > 1 and argv[1] in COMMANDS + ("-h", "--help"):
+        # The command line interface never loads GTK
+        from footprintotp.cli import main
+        exit(main(argv))
+    from footprintotp.main import main
     main(argv)
@@ -1,9 +1,17 @@
 from os.path import dirname, join, basename, normpath, expanduser
-from platform import system
-from textwrap import TextWrapper
-from json import loads, dumps
-from gi.repository import GLib
-from platformdirs import user_config_dir, user_data_dir
+
+# Names exported to `from . import *`, including the lazy ones below
+__all__ = [
+    "APPNAME",
+    "ID",
+    "APPDIR",
+    "CONF",
+    "DATA",
+    "DEFAULT",
+    "bn",
+    "lnbr",
+    "validate_config"
+]
 
 # Application version
 __version__ = "1.0.3"
@@ -13,18 +21,43 @@ APPNAME = "Footprint OTP"
 ID = "me.zevlee.FootprintOTP"
 # Application directory
 APPDIR = dirname(dirname(__file__))
-# Config and data directories
-CONF = user_config_dir(APPNAME)
-DATA = user_data_dir(APPNAME)
-# Default settings
-DEFAULT = {
-    "dflt": expanduser("~"),
-    "keys": join(DATA, "keys"),
-    "save": "",
-    "encf": False,
-    "appr": True,
-    "dbug": False
-}
+
+
+def __getattr__(name):
+    """
+    Compute the config and data directories and the default settings on
+    first access, so that importing the package does not load
+    `platformdirs`
+
+    :param name: Attribute name
+    :type name: str
+    :return: Attribute value
+    :rtype: Any
+    """
+    # Also called directly by the functions below, which do not trigger it
+    if name in globals():
+        return globals()[name]
+    if name == "CONF":
+        from platformdirs import user_config_dir
+        value = user_config_dir(APPNAME)
+    elif name == "DATA":
+        from platformdirs import user_data_dir
+        value = user_data_dir(APPNAME)
+    elif name == "DEFAULT":
+        # Default settings
+        value = {
+            "dflt": expanduser("~"),
+            "keys": join(__getattr__("DATA"), "keys"),
+            "save": "",
+            "encf": False,
+            "appr": True,
+            "dbug": False
+        }
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Later lookups find the value directly
+    globals()[name] = value
+    return value
 
 
 def bn(filename):
@@ -51,54 +84,18 @@ def lnbr(text, char=70):
     :return: Text with line breaks
     :rtype: str
     """
+    from textwrap import TextWrapper
     t = TextWrapper(width=char, break_on_hyphens=False)
     return t.fill(text)
 
 
-def _read_config(filename):
-    """
-    Given a filename `filename`, return the configuration dictionary or
-    the default configuration if `filename` is not found
-    
-    :param filename: Filename
-    :type filename: str
-    :return: Configuration dictionary
-    :rtype: dict
-    """
-    try:
-        config = loads(open(join(CONF, filename), "r").read())
-    except FileNotFoundError:
-        config = DEFAULT
-    return config
-
-
 def validate_config(filename):
     """
-    Given a filename `filename`, replace the file with filename `default`
-    if it is not valid
+    Given a filename `filename`, correct the configuration in the file if
+    it is not valid, see `config.Config.validate`
     
     :param filename: Config filename
     :type filename: str
-    :param default: Default filename
-    :type default: str
     """
-    overwrite = False
-    config = _read_config(filename)
-    # Remove invalid keys
-    for key in [k for k in config.keys() if k not in DEFAULT.keys()]:
-        config.pop(key)
-        overwrite = True
-    # Add missing keys
-    for key in [k for k in DEFAULT.keys() if k not in config.keys()]:
-        config[key] = DEFAULT[key]
-        overwrite = True
-    # Validate config options
-    for k in ["encf", "appr", "dbug"]:
-        if not isinstance(config[k], int):
-            config[k] = DEFAULT[k]
-            overwrite = True
-    # Overwrite filename if there is an error
-    if overwrite:
-        with open(join(CONF, filename), "w") as c:
-            c.write(dumps(config))
-            c.close()
+    from .config import Config
+    Config(filename).copy()
@@ -1,11 +1,11 @@
 from os import mkdir
 from os.path import join, exists
 from platform import system
-from json import loads, dumps
 from gi import require_versions
 require_versions({"Gtk": "4.0", "Adw": "1"})
 from gi.repository import Gtk, Gdk, Gio, GLib, Adw
 from . import *
+from .config import settings
 from .window import Window
 
 
@@ -41,27 +41,11 @@ class Application(Adw.Application):
             mkdir(DATA)
         if not exists(join(DATA, "keys")):
             mkdir(join(DATA, "keys"))
-        if not exists(join(CONF, "settings.json")):
-            with open(join(CONF, "settings.json"), "w") as d:
-                d.write(dumps(DEFAULT))
-                d.close()
-        if not exists(join(DATA, "otp.log")):
-            open(join(DATA, "otp.log"), "w").close()
-        
-        # Validate config file
-        validate_config("settings.json")
 
-        # Set color scheme
-        config = loads(open(join(CONF, "settings.json"), "r").read())
-        appearance = config["appr"]
-        if appearance:
-            self.get_style_manager().set_color_scheme(
-                Adw.ColorScheme.FORCE_DARK
-            )
-        else:
-            self.get_style_manager().set_color_scheme(
-                Adw.ColorScheme.FORCE_LIGHT
-            )
+        # Set color scheme, and again whenever the preferences are saved.
+        # Reading the settings creates or corrects the config file
+        self.set_color_scheme(settings.copy())
+        settings.subscribe(self.set_color_scheme)
 
         # Set up icons for linux
         if system() == "Linux":
@@ -72,6 +56,22 @@ class Application(Adw.Application):
                 join(APPDIR, "usr", "share", "icons")
             )
 
+    def set_color_scheme(self, config):
+        """
+        Apply the appearance setting of `config`
+
+        :param config: Configuration dictionary
+        :type config: dict
+        """
+        if config["appr"]:
+            self.get_style_manager().set_color_scheme(
+                Adw.ColorScheme.FORCE_DARK
+            )
+        else:
+            self.get_style_manager().set_color_scheme(
+                Adw.ColorScheme.FORCE_LIGHT
+            )
+
     def do_activate(self):
         """
         Activate application
@@ -0,0 +1,277 @@
+from asyncio import CancelledError, Semaphore, get_running_loop, shield, wait
+from .durable import SyncGroup, discard
+from .stream_cipher import StreamCipher, CHUNK_SIZE
+
+
+def _advance(steps):
+    """
+    Run the next step of the step generator `steps`
+
+    `StopIteration` cannot be set on a future, so the end of the generator
+    is returned instead.
+
+    :param steps: Step generator
+    :type steps: Iterator[int]
+    :return: Tuple of whether `steps` has ended and the number of bytes
+        written so far, or the return value of `steps` once it has ended
+    :rtype: tuple
+    """
+    try:
+        return False, next(steps)
+    except StopIteration as e:
+        return True, e.value
+
+
+class AsyncStreamCipher:
+    """
+    asyncio counterpart of `StreamCipher`
+
+    File I/O and XOR run in `executor` one chunk at a time, so the event
+    loop stays responsive and a cancelled operation stops after the chunk
+    in progress and removes its partial output. An operation cancelled
+    while committing its outputs finishes the commit before raising. At
+    most `concurrency` operations run at once.
+
+    :param concurrency: Maximum number of concurrent operations
+    :type concurrency: int
+    :param executor: Executor, or None for the loop's default executor
+    :type executor: concurrent.futures.Executor
+    """
+    def __init__(self, concurrency=4, executor=None):
+        """
+        Constructor
+        """
+        self.executor = executor
+        self._limit = Semaphore(concurrency)
+
+    async def _run(self, func, *args):
+        """
+        Run `func` with arguments `args` in the executor
+
+        :param func: Function
+        :type func: Callable
+        :return: Return value of `func`
+        :rtype: Any
+        """
+        return await get_running_loop().run_in_executor(
+            self.executor, func, *args
+        )
+
+    async def _commit(self, func, *args):
+        """
+        Run `func` with arguments `args` in the executor like `_run`, but if
+        the operation is cancelled meanwhile, wait for `func` to finish
+        before raising, so that the outputs it commits are complete once the
+        caller sees the cancellation
+
+        :param func: Function
+        :type func: Callable
+        :return: Return value of `func`
+        :rtype: Any
+        """
+        call = get_running_loop().run_in_executor(self.executor, func, *args)
+        try:
+            return await shield(call)
+        except CancelledError:
+            await wait([call])
+            raise
+
+    async def _drive(self, steps, group, release=None):
+        """
+        Advance the step generator `steps` one chunk per executor call and
+        return what it returns
+
+        If the operation is cancelled, the chunk in progress is left to
+        finish, then `steps` is closed so that it removes its partial output,
+        and the files it already added to the sync group `group` are
+        dropped. If `steps` had already ended, `release` is called with
+        what it returned.
+
+        :param steps: Step generator, see `StreamCipher._encrypt_steps`
+        :type steps: Iterator[int]
+        :param group: Sync group that `steps` adds its outputs to
+        :type group: durable.SyncGroup
+        :param release: Function undoing what a finished `steps` returned
+        :type release: Callable
+        :return: Return value of `steps`
+        :rtype: Any
+        """
+        step = None
+        try:
+            while True:
+                step = get_running_loop().run_in_executor(
+                    self.executor, _advance, steps
+                )
+                # Cancelling the task must not cancel the chunk in progress,
+                # which would leave it running with no way to wait for it
+                ended, value = await shield(step)
+                if ended:
+                    return value
+        except CancelledError:
+            if step is not None:
+                await wait([step])
+            steps.close()
+            group.discard()
+            if (
+                release is not None
+                and step is not None
+                and not step.cancelled()
+                and step.exception() is None
+                and step.result()[0]
+            ):
+                release(step.result()[1])
+            raise
+
+    async def xor(self, message, key, chunk_size=CHUNK_SIZE):
+        """
+        Given bytes inputs `message` and `key`, return the bitwise XOR of the
+        two, truncated to the shorter of the two
+
+        :param message: Message
+        :type message: bytes
+        :param key: Key
+        :type key: bytes
+        :param chunk_size: Number of bytes XORed per executor call
+        :type chunk_size: int
+        :return: Bitwise XOR of message and key
+        :rtype: bytes
+        """
+        size = min(len(message), len(key))
+        message = memoryview(message)
+        key = memoryview(key)
+        result = bytearray(size)
+        view = memoryview(result)
+        async with self._limit:
+            for start in range(0, size, chunk_size):
+                end = min(start + chunk_size, size)
+                await self._run(
+                    StreamCipher._xor_into,
+                    view[start:end],
+                    message[start:end],
+                    key[start:end],
+                    end - start
+                )
+        return bytes(result)
+
+    async def encrypt_file(
+        self,
+        filename,
+        key_file,
+        file_dir="",
+        keys_dir="",
+        log_dir="",
+        enc_names=False,
+        del_toggle=False,
+        chunk_size=CHUNK_SIZE,
+        backend="stream",
+        pad=False,
+        pool=None,
+        move_key=False
+    ):
+        """
+        Given a filename, writes the encrypted message and corresponding key
+        to separate files, see `StreamCipher.encrypt_file`
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :param keys_dir: Keys directory
+        :type keys_dir: str
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param enc_names: Encrypt filenames option
+        :type enc_names: bool
+        :param del_toggle: Delete files option
+        :type del_toggle: bool
+        :param chunk_size: Number of bytes per executor call
+        :type chunk_size: int
+        :param backend: XOR backend, see `StreamCipher.xor_file`
+        :type backend: str
+        :param pad: Shared pad option
+        :type pad: bool
+        :param pool: Key pool
+        :type pool: key_pool.KeyPool
+        :param move_key: Move rather than copy the key option
+        :type move_key: bool
+        :return: Tuple of encrypted filename and key filename
+        :rtype: tuple
+        """
+        async with self._limit:
+            key_file, key_offset = await self._run(
+                StreamCipher._take_key, filename, key_file, log_dir, pad, pool
+            )
+            group = SyncGroup()
+            steps = StreamCipher._encrypt_steps(
+                filename,
+                key_file,
+                file_dir,
+                keys_dir,
+                enc_names,
+                key_offset,
+                move_key,
+                chunk_size,
+                backend,
+                group=group
+            )
+            enc_filename, key_filename = await self._drive(steps, group)
+            await self._commit(
+                StreamCipher._commit_encrypt,
+                filename,
+                enc_filename,
+                key_filename,
+                log_dir,
+                del_toggle,
+                group
+            )
+        return enc_filename, key_filename
+
+    async def decrypt_file(
+        self,
+        filename,
+        key_file,
+        file_dir="",
+        log_dir="",
+        del_toggle=False,
+        chunk_size=CHUNK_SIZE,
+        backend="stream"
+    ):
+        """
+        Given a file and key file, reads the encrypted message from file
+        using the key from key_file, see `StreamCipher.decrypt_file`
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename or pad segment reference
+        :type key_file: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param del_toggle: Delete files option
+        :type del_toggle: bool
+        :param chunk_size: Number of bytes per executor call
+        :type chunk_size: int
+        :param backend: XOR backend, see `StreamCipher.xor_file`
+        :type backend: str
+        :return: Decrypted filename
+        :rtype: str
+        """
+        async with self._limit:
+            group = SyncGroup()
+            steps = StreamCipher._decrypt_steps(
+                filename, key_file, file_dir, chunk_size, backend, group=group
+            )
+            # A decryption cancelled once done still holds its claimed name
+            dec_file = await self._drive(steps, group, discard)
+            await self._commit(
+                StreamCipher._commit_decrypt,
+                filename,
+                key_file,
+                log_dir,
+                del_toggle,
+                group
+            )
+        return dec_file
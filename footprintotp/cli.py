@@ -0,0 +1,577 @@
+from argparse import ArgumentParser, BooleanOptionalAction
+from os import makedirs
+from os.path import abspath, dirname, isdir, getsize
+from sys import stderr
+from . import __version__
+from . import *
+from .config import settings
+from .log_store import LogStore
+from .profiling import profiled, reports
+from .stats import Stats
+from .stream_cipher import StreamCipher, BACKENDS, CHUNK_SIZE
+
+# Subcommands, used by the entry script to choose between GUI and CLI
+COMMANDS = ("encrypt", "decrypt", "pack", "unpack", "keygen", "log")
+# Multipliers of size suffixes
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(text):
+    """
+    Given a size such as "4096", "64K" or "2G", return the number of bytes
+
+    :param text: Size
+    :type text: str
+    :return: Number of bytes
+    :rtype: int
+    """
+    text = text.strip().upper().removesuffix("B")
+    if text[-1:] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def _set_up_parser(config):
+    """
+    Set up argument parser
+
+    :param config: Configuration dictionary
+    :type config: dict
+    :return: Argument parser
+    :rtype: argparse.ArgumentParser
+    """
+    parser = ArgumentParser(
+        prog="footprint-otp",
+        description=f"{APPNAME} {__version__} command line"
+    )
+    subparsers = parser.add_subparsers(dest="COMMAND", required=True)
+
+    # Options shared by encrypt and decrypt
+    common = ArgumentParser(add_help=False)
+    common.add_argument(
+        "-o", "--outdir",
+        action="store",
+        help="Save location, defaults to the directory of the input",
+        dest="OUTDIR",
+        default=config["save"]
+    )
+    common.add_argument(
+        "--delete",
+        action="store_true",
+        help="Delete the input files afterwards",
+        dest="DELETE",
+        default=False
+    )
+    common.add_argument(
+        "--backend",
+        action="store",
+        help="XOR backend",
+        dest="BACKEND",
+        choices=BACKENDS,
+        default="auto"
+    )
+    common.add_argument(
+        "--workers",
+        action="store",
+        type=int,
+        help="Number of XOR worker processes, 0 for one per core",
+        dest="WORKERS",
+        default=1
+    )
+    common.add_argument(
+        "--chunk-size",
+        action="store",
+        type=parse_size,
+        help="Number of bytes read from each file at a time",
+        dest="CHUNK_SIZE",
+        default=CHUNK_SIZE
+    )
+    common.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print the bytes, throughput and time spent in each phase",
+        dest="STATS",
+        default=False
+    )
+    common.add_argument(
+        "--profile",
+        action=BooleanOptionalAction,
+        help="Write a profiling report, on by default in debug mode",
+        dest="PROFILE",
+        default=bool(config["dbug"])
+    )
+
+    encrypt = subparsers.add_parser(
+        "encrypt",
+        parents=[common],
+        help="Encrypt a file or every file in a directory"
+    )
+    encrypt.add_argument("PATH", help="File or directory to encrypt")
+    encrypt.add_argument(
+        "KEY",
+        nargs="?",
+        help="Key file, or shared pad with --pad; generated if omitted"
+    )
+    encrypt.add_argument(
+        "--keys-dir",
+        action="store",
+        help="Keys location",
+        dest="KEYS",
+        default=config["keys"]
+    )
+    encrypt.add_argument(
+        "--encrypt-names",
+        action="store_true",
+        help="Encrypt file names",
+        dest="ENCF",
+        default=config["encf"]
+    )
+    encrypt.add_argument(
+        "--pad",
+        action="store_true",
+        help="Use the key file as a shared pad",
+        dest="PAD",
+        default=False
+    )
+
+    decrypt = subparsers.add_parser(
+        "decrypt",
+        parents=[common],
+        help="Decrypt a file or every .otp file in a directory"
+    )
+    decrypt.add_argument("PATH", help="File or directory to decrypt")
+    decrypt.add_argument(
+        "KEY",
+        nargs="?",
+        help="Key file or pad segment reference; looked up if omitted"
+    )
+
+    pack = subparsers.add_parser(
+        "pack",
+        help="Encrypt every file in a directory into one container"
+    )
+    pack.add_argument("PATH", help="Directory to pack")
+    pack.add_argument(
+        "KEY",
+        nargs="?",
+        help="Key file, or shared pad with --pad; generated if omitted"
+    )
+    pack.add_argument(
+        "-o", "--outdir",
+        action="store",
+        help="Save location, defaults to the parent of the directory",
+        dest="OUTDIR",
+        default=config["save"]
+    )
+    pack.add_argument(
+        "--delete",
+        action="store_true",
+        help="Delete the packed files afterwards",
+        dest="DELETE",
+        default=False
+    )
+    pack.add_argument(
+        "--keys-dir",
+        action="store",
+        help="Keys location",
+        dest="KEYS",
+        default=config["keys"]
+    )
+    pack.add_argument(
+        "--encrypt-names",
+        action="store_true",
+        help="Encrypt the container name",
+        dest="ENCF",
+        default=config["encf"]
+    )
+    pack.add_argument(
+        "--pad",
+        action="store_true",
+        help="Use the key file as a shared pad",
+        dest="PAD",
+        default=False
+    )
+
+    unpack = subparsers.add_parser(
+        "unpack",
+        help="List or extract the files of a container"
+    )
+    unpack.add_argument("PATH", help="Container to unpack")
+    unpack.add_argument(
+        "KEY",
+        nargs="?",
+        help="Key file or pad segment reference; looked up if omitted"
+    )
+    unpack.add_argument(
+        "-o", "--outdir",
+        action="store",
+        help="Save location, defaults to the directory of the container",
+        dest="OUTDIR",
+        default=config["save"]
+    )
+    unpack.add_argument(
+        "--delete",
+        action="store_true",
+        help="Delete the container and its key after extracting everything",
+        dest="DELETE",
+        default=False
+    )
+    unpack.add_argument(
+        "--member",
+        action="append",
+        help="Only extract this member, may be repeated",
+        dest="MEMBERS",
+        default=None
+    )
+    unpack.add_argument(
+        "--list",
+        action="store_true",
+        help="List the members and their sizes instead of extracting",
+        dest="LIST",
+        default=False
+    )
+
+    keygen = subparsers.add_parser(
+        "keygen",
+        help="Generate a random key"
+    )
+    keygen.add_argument(
+        "SIZE",
+        type=parse_size,
+        help="Key size in bytes, with an optional K, M, G or T suffix"
+    )
+    keygen.add_argument(
+        "--keys-dir",
+        action="store",
+        help="Keys location",
+        dest="KEYS",
+        default=config["keys"]
+    )
+    keygen.add_argument(
+        "--name",
+        action="store",
+        help="Key filename, random if omitted",
+        dest="NAME",
+        default=None
+    )
+    keygen.add_argument(
+        "--workers",
+        action="store",
+        type=int,
+        help="Number of threads, 0 for one per core",
+        dest="WORKERS",
+        default=0
+    )
+
+    subparsers.add_parser(
+        "log",
+        help="List the entries of the file log"
+    )
+    return parser
+
+
+def _find_key(filename):
+    """
+    Given an encrypted filename, return its key from the log
+
+    :param filename: Encrypted filename
+    :type filename: str
+    :return: Key filename or pad segment reference
+    :rtype: str
+    """
+    entry = LogStore(DATA).find(filename)
+    if entry is None:
+        raise FileNotFoundError(f"No log entry for {bn(filename)}")
+    return entry[2]
+
+
+def _check_tree_options(parser, args):
+    """
+    Exit with a usage error if an encrypt or decrypt subcommand run on a
+    directory has options that only apply to single files
+
+    Directories are encrypted with a shared pad or generated keys and
+    decrypted with the keys in the log, one thread per file.
+
+    :param parser: Argument parser
+    :type parser: argparse.ArgumentParser
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    """
+    if args.COMMAND not in ("encrypt", "decrypt") or not isdir(args.PATH):
+        return
+    if args.KEY is not None and args.COMMAND == "decrypt":
+        parser.error("the keys of a directory are looked up in the log")
+    if args.KEY is not None and not args.PAD:
+        parser.error("the KEY of a directory must be a shared pad, see --pad")
+    unsupported = [
+        option for option, given in (
+            ("--backend", args.BACKEND != "auto"),
+            ("--workers", args.WORKERS != 1),
+            ("--stats", args.STATS)
+        ) if given
+    ]
+    if unsupported:
+        parser.error(
+            f"not supported for directories: {', '.join(unsupported)}"
+        )
+
+
+def _outdir(args):
+    """
+    Return the absolute save location of an encrypt or decrypt subcommand
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    :return: Save location
+    :rtype: str
+    """
+    if args.OUTDIR:
+        return abspath(args.OUTDIR)
+    if isdir(args.PATH):
+        return abspath(args.PATH)
+    return dirname(abspath(args.PATH))
+
+
+def _profiled(args, func, name):
+    """
+    Return `func`, profiled if the subcommand asked for it
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    :param func: Function
+    :type func: Callable
+    :param name: Operation name
+    :type name: str
+    :return: Function
+    :rtype: Callable
+    """
+    if args.PROFILE:
+        return profiled(func, name)
+    return func
+
+
+def _report(result):
+    """
+    Print the report of a directory run and return the exit status
+
+    :param result: Report of `encrypt_tree` or `decrypt_tree`
+    :type result: dict
+    :return: Return code
+    :rtype: int
+    """
+    for filename, error in result["errors"]:
+        print(f"{filename}: {error}", file=stderr)
+    print(
+        f"{result['files']} files, {result['bytes']} bytes, "
+        f"{result['seconds']:.3f} s, {len(result['errors'])} errors"
+    )
+    return 1 if result["errors"] else 0
+
+
+def _encrypt(args):
+    """
+    Run the encrypt subcommand
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    :return: Return code
+    :rtype: int
+    """
+    outdir = _outdir(args)
+    if isdir(args.PATH):
+        return _report(
+            _profiled(args, StreamCipher.encrypt_tree, "encrypt")(
+                args.PATH,
+                outdir,
+                args.KEYS,
+                DATA,
+                args.ENCF,
+                args.DELETE,
+                args.KEY,
+                chunk_size=args.CHUNK_SIZE
+            )
+        )
+    key = args.KEY
+    if key is None:
+        from .keygen import KeyGen
+        key = KeyGen.generate(getsize(args.PATH), args.KEYS)
+    stats = Stats()
+    enc, key = _profiled(args, StreamCipher.encrypt_file, "encrypt")(
+        args.PATH,
+        key,
+        outdir,
+        args.KEYS,
+        DATA,
+        args.ENCF,
+        args.DELETE,
+        args.CHUNK_SIZE,
+        args.BACKEND,
+        args.WORKERS or None,
+        args.PAD,
+        stats=stats
+    )
+    print(f"Encrypted\t{enc}\nKey\t{key}")
+    if args.STATS:
+        print(stats.report())
+    if args.PROFILE:
+        print(f"Profile\t{reports()[0]}")
+    return 0
+
+
+def _decrypt(args):
+    """
+    Run the decrypt subcommand
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    :return: Return code
+    :rtype: int
+    """
+    outdir = _outdir(args)
+    if isdir(args.PATH):
+        return _report(
+            _profiled(args, StreamCipher.decrypt_tree, "decrypt")(
+                args.PATH,
+                outdir,
+                DATA,
+                args.DELETE,
+                chunk_size=args.CHUNK_SIZE
+            )
+        )
+    stats = Stats()
+    dec = _profiled(args, StreamCipher.decrypt_file, "decrypt")(
+        args.PATH,
+        args.KEY or _find_key(args.PATH),
+        outdir,
+        DATA,
+        args.DELETE,
+        args.CHUNK_SIZE,
+        args.BACKEND,
+        args.WORKERS or None,
+        stats=stats
+    )
+    print(f"Decrypted\t{dec}")
+    if args.STATS:
+        print(stats.report())
+    if args.PROFILE:
+        print(f"Profile\t{reports()[0]}")
+    return 0
+
+
+def _pack(args):
+    """
+    Run the pack subcommand
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    :return: Return code
+    :rtype: int
+    """
+    from .container import Container
+    enc, key = Container.pack(
+        args.PATH,
+        abspath(args.OUTDIR or dirname(args.PATH)),
+        args.KEY,
+        args.KEYS,
+        DATA,
+        args.ENCF,
+        args.DELETE,
+        args.PAD
+    )
+    print(f"Packed\t{enc}\nKey\t{key}")
+    return 0
+
+
+def _unpack(args):
+    """
+    Run the unpack subcommand
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    :return: Return code
+    :rtype: int
+    """
+    from .container import Container
+    container = Container(args.PATH, args.KEY or _find_key(args.PATH))
+    if args.LIST:
+        for name, size in container.members():
+            print(f"{size}\t{name}")
+        return 0
+    outdir = _outdir(args)
+    if args.MEMBERS:
+        for name in args.MEMBERS:
+            try:
+                print(f"Extracted\t{container.extract(name, outdir)}")
+            except KeyError:
+                raise ValueError(f"No member {name}") from None
+        return 0
+    for dec in container.extract_all(outdir, DATA, args.DELETE):
+        print(f"Extracted\t{dec}")
+    return 0
+
+
+def _keygen(args):
+    """
+    Run the keygen subcommand
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    :return: Return code
+    :rtype: int
+    """
+    from .keygen import KeyGen
+    key = KeyGen.generate(args.SIZE, args.KEYS, args.NAME, args.WORKERS or None)
+    print(key)
+    return 0
+
+
+def _log(args):
+    """
+    Run the log subcommand
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    :return: Return code
+    :rtype: int
+    """
+    for entry in StreamCipher.read_log(DATA):
+        print("\t".join(entry))
+    return 0
+
+
+def main(argv):
+    """
+    Run the command line interface
+
+    Nothing here imports GTK, so it works on machines without a display.
+
+    :param argv: Command line arguments, starting with the program name
+    :type argv: list
+    :return: Return code
+    :rtype: int
+    """
+    parser = _set_up_parser(settings.copy())
+    args = parser.parse_args(argv[1:])
+    # The log matches files by absolute path, so relative paths must not
+    # reach the cipher
+    if "PATH" in args:
+        args.PATH = abspath(args.PATH)
+    _check_tree_options(parser, args)
+    makedirs(DATA, exist_ok=True)
+    if "KEYS" in args:
+        args.KEYS = abspath(args.KEYS)
+        makedirs(args.KEYS, exist_ok=True)
+    commands = {
+        "encrypt": _encrypt,
+        "decrypt": _decrypt,
+        "pack": _pack,
+        "unpack": _unpack,
+        "keygen": _keygen,
+        "log": _log
+    }
+    try:
+        return commands[args.COMMAND](args)
+    except (OSError, ValueError) as e:
+        print(f"{args.COMMAND}: {e}", file=stderr)
+        return 1
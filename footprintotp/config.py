@@ -0,0 +1,153 @@
+from os import makedirs, replace
+from os.path import join
+from threading import Lock
+from . import *
+
+# Settings that must be integers, which includes booleans
+INT_KEYS = ("encf", "appr", "dbug")
+
+
+class Config:
+    """
+    Settings read from `filename` in the config directory once and then
+    served from memory
+
+    The settings are validated when first read, and written back if they
+    had to be corrected. Saved settings replace the file whole, so a crash
+    cannot leave it truncated, and every subscriber is called with the
+    new settings.
+
+    :param filename: Config filename
+    :type filename: str
+    """
+    def __init__(self, filename="settings.json"):
+        """
+        Constructor
+        """
+        self.filename = filename
+        self._config = None
+        self._subscribers = []
+        self._lock = Lock()
+
+    @staticmethod
+    def validate(config):
+        """
+        Remove unknown keys from the configuration dictionary `config`, add
+        missing ones and reset invalid options to their defaults
+
+        :param config: Configuration dictionary
+        :type config: dict
+        :return: Whether `config` was changed
+        :rtype: bool
+        """
+        overwrite = False
+        # Remove invalid keys
+        for key in [k for k in config.keys() if k not in DEFAULT.keys()]:
+            config.pop(key)
+            overwrite = True
+        # Add missing keys
+        for key in [k for k in DEFAULT.keys() if k not in config.keys()]:
+            config[key] = DEFAULT[key]
+            overwrite = True
+        # Validate config options
+        for k in INT_KEYS:
+            if not isinstance(config[k], int):
+                config[k] = DEFAULT[k]
+                overwrite = True
+        return overwrite
+
+    def _write(self, config):
+        """
+        Replace the config file with `config`
+
+        :param config: Configuration dictionary
+        :type config: dict
+        """
+        from json import dumps
+        makedirs(CONF, exist_ok=True)
+        config_file = join(CONF, self.filename)
+        tmp = f"{config_file}.tmp"
+        with open(tmp, "w") as c:
+            c.write(dumps(config))
+            c.close()
+        replace(tmp, config_file)
+
+    def _load(self):
+        """
+        Return the settings, reading and validating them on first use
+
+        :return: Configuration dictionary
+        :rtype: dict
+        """
+        if self._config is None:
+            from json import loads
+            with self._lock:
+                if self._config is None:
+                    try:
+                        with open(join(CONF, self.filename), "r") as c:
+                            config = loads(c.read())
+                    except (FileNotFoundError, ValueError):
+                        config = {}
+                    if not isinstance(config, dict):
+                        config = {}
+                    if self.validate(config):
+                        self._write(config)
+                    self._config = config
+        return self._config
+
+    def __getitem__(self, key):
+        """
+        Return the setting `key`
+
+        :param key: Setting name
+        :type key: str
+        :return: Setting value
+        :rtype: Any
+        """
+        return self._load()[key]
+
+    def copy(self):
+        """
+        Return a copy of the settings
+
+        :return: Configuration dictionary
+        :rtype: dict
+        """
+        return dict(self._load())
+
+    def save(self, config):
+        """
+        Validate and write the settings `config`, then notify subscribers
+
+        :param config: Configuration dictionary
+        :type config: dict
+        """
+        config = dict(config)
+        self.validate(config)
+        with self._lock:
+            self._write(config)
+            self._config = config
+        for callback in list(self._subscribers):
+            callback(config)
+
+    def subscribe(self, callback):
+        """
+        Call `callback` with the new settings whenever they are saved
+
+        :param callback: Function taking the configuration dictionary
+        :type callback: Callable
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Stop calling `callback` when the settings are saved
+
+        :param callback: Function passed to `subscribe`
+        :type callback: Callable
+        """
+        self._subscribers.remove(callback)
+
+
+# Settings shared by the whole application
+settings = Config()
@@ -0,0 +1,380 @@
+from os import makedirs, remove, walk, sep
+from os.path import abspath, dirname, getsize, join, relpath, isabs
+from struct import Struct, error as StructError
+from . import bn
+from .durable import SyncGroup, SYNC_GROUP, temp_name, discard
+from .pad import Pad, key_ref, parse_key_ref
+from .stream_cipher import StreamCipher, CHUNK_SIZE
+
+# Extension of container filenames
+EXT = ".otpc"
+# Identifies a container in its footer, and the version of the format
+MAGIC = b"FPOTPC01"
+# Footer of magic, index offset and index length, stored in the clear
+FOOTER = Struct("<8sQQ")
+# Number of members, at the start of the index
+COUNT = Struct("<Q")
+# Offset, size and name length of a member, followed by its name
+ENTRY = Struct("<QQH")
+
+
+class Container:
+    """
+    Many files packed into one `.otpc` file and encrypted with one
+    contiguous key, so that a batch of small files costs one ciphertext,
+    one key and one log entry instead of one of each per file
+
+    The container holds the members back to back, then an index of their
+    names, offsets and sizes, both XORed with the key from `key_offset`,
+    then a footer giving where the index starts. Member names only exist
+    inside the encrypted index, so they are hidden whether or not file
+    names are encrypted. A member is extracted by decrypting the index and
+    then only its own byte range.
+
+    :param filename: Container filename
+    :type filename: str
+    :param key_file: Key filename or pad segment reference
+    :type key_file: str
+    """
+    def __init__(self, filename, key_file):
+        """
+        Constructor
+        """
+        self.filename = filename
+        self.key_ref = key_file
+        self.key_file, key_offset = parse_key_ref(key_file)
+        self.key_offset = key_offset or 0
+        self._index = None
+
+    @staticmethod
+    def _members(src_dir):
+        """
+        Return every file below `src_dir` along with its name in the
+        container, which uses "/" whatever the platform
+
+        :param src_dir: Source directory
+        :type src_dir: str
+        :return: List of tuples of filename and member name
+        :rtype: list
+        """
+        members = []
+        for root, dirs, files in walk(src_dir):
+            dirs.sort()
+            for f in sorted(files):
+                filename = join(root, f)
+                name = relpath(filename, src_dir).replace(sep, "/")
+                members.append((filename, name))
+        return members
+
+    @staticmethod
+    def _build_index(names, sizes):
+        """
+        Return the index of members `names` of sizes `sizes`, stored in
+        that order
+
+        :param names: Member names
+        :type names: list
+        :param sizes: Member sizes
+        :type sizes: list
+        :return: Index
+        :rtype: bytes
+        """
+        parts = [COUNT.pack(len(names))]
+        offset = 0
+        for name, size in zip(names, sizes):
+            encoded = name.encode()
+            parts.append(ENTRY.pack(offset, size, len(encoded)))
+            parts.append(encoded)
+            offset += size
+        return b"".join(parts)
+
+    @staticmethod
+    def _parse_index(index):
+        """
+        Return the members listed in `index`
+
+        :param index: Decrypted index
+        :type index: bytes
+        :return: Dictionary of member name to tuple of offset and size
+        :rtype: dict
+        :raises ValueError: If the index cannot be read, which usually
+            means the key is wrong
+        """
+        try:
+            count, = COUNT.unpack_from(index)
+            pos = COUNT.size
+            members = {}
+            for _ in range(count):
+                offset, size, length = ENTRY.unpack_from(index, pos)
+                pos += ENTRY.size
+                name = index[pos:pos + length].decode()
+                pos += length
+                members[name] = (offset, size)
+        except (StructError, UnicodeDecodeError):
+            raise ValueError("Wrong key or damaged container") from None
+        return members
+
+    @staticmethod
+    def _xor_copy(src, key, out, size, chunk_size=CHUNK_SIZE):
+        """
+        Write `size` bytes of `src` XORed with `key` to `out`, reading both
+        from their current positions
+
+        :param src: Input file
+        :type src: io.BufferedReader
+        :param key: Key file
+        :type key: io.BufferedReader
+        :param out: Output file
+        :type out: io.BufferedWriter
+        :param size: Number of bytes
+        :type size: int
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        :raises EOFError: If either input ends early
+        """
+        m_buf = memoryview(bytearray(min(chunk_size, size) or 1))
+        k_buf = memoryview(bytearray(len(m_buf)))
+        done = 0
+        while done < size:
+            n = min(len(m_buf), size - done)
+            if src.readinto(m_buf[:n]) != n or key.readinto(k_buf[:n]) != n:
+                raise EOFError(f"Unexpected end of file at offset {done}")
+            StreamCipher._xor_into(m_buf, m_buf, k_buf, n)
+            out.write(m_buf[:n])
+            done += n
+
+    @staticmethod
+    def pack(
+        src_dir,
+        file_dir="",
+        key_file=None,
+        keys_dir="",
+        log_dir="",
+        enc_names=False,
+        del_toggle=False,
+        pad=False,
+        move_key=False,
+        chunk_size=CHUNK_SIZE
+    ):
+        """
+        Pack every file below `src_dir` into a container in `file_dir`
+
+        The key covers the members and the index. If `key_file` is None, a
+        key of exactly that size is generated in `keys_dir`. If `pad` is
+        set, `key_file` is a shared pad and one segment of it is allocated
+        for the whole container. The container name follows
+        `StreamCipher.encrypt_filename` with the `.otpc` extension.
+
+        The container and key are made durable before the single log entry
+        is written, and the sources are only deleted after that.
+
+        :param src_dir: Source directory
+        :type src_dir: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :param key_file: Key filename, shared pad filename, or None
+        :type key_file: str
+        :param keys_dir: Keys directory
+        :type keys_dir: str
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param enc_names: Encrypt the container filename option
+        :type enc_names: bool
+        :param del_toggle: Delete files option
+        :type del_toggle: bool
+        :param pad: Shared pad option
+        :type pad: bool
+        :param move_key: Move rather than copy the key option
+        :type move_key: bool
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :return: Tuple of container filename and key filename
+        :rtype: tuple
+        :raises ValueError: If there is nothing to pack or the key is too
+            short
+        """
+        members = Container._members(src_dir)
+        if not members:
+            raise ValueError(f"No files in {src_dir}")
+        sizes = [getsize(filename) for filename, _ in members]
+        index = Container._build_index([name for _, name in members], sizes)
+        data_size = sum(sizes)
+        total = data_size + len(index)
+        key_offset = 0
+        if key_file is None:
+            from .keygen import KeyGen
+            key_file = KeyGen.generate(total, keys_dir)
+        elif pad:
+            key_offset = Pad(key_file, log_dir).allocate(total)
+        if getsize(key_file) - key_offset < total:
+            raise ValueError(f"Key is shorter than the {total} bytes needed")
+        enc_filename, key_filename = StreamCipher.encrypt_filename(
+            abspath(src_dir), key_file, enc_names, file_dir, keys_dir
+        )
+        enc_filename = enc_filename.removesuffix(".otp") + EXT
+        if pad:
+            key_filename = key_ref(key_file, key_offset)
+        group = SyncGroup()
+        temp = temp_name(enc_filename)
+        try:
+            with open(key_file, "rb") as k, open(temp, "wb") as o:
+                k.seek(key_offset)
+                for (filename, _), size in zip(members, sizes):
+                    with open(filename, "rb") as m:
+                        Container._xor_copy(m, k, o, size, chunk_size)
+                o.write(StreamCipher.xor(index, k.read(len(index))))
+                o.write(FOOTER.pack(MAGIC, data_size, len(index)))
+            if not pad:
+                StreamCipher._place_key(
+                    key_file, key_filename, total, move_key, chunk_size, group
+                )
+        except BaseException:
+            discard(temp)
+            raise
+        group.add(enc_filename, temp)
+        group.commit()
+        StreamCipher._append_log(
+            log_dir, [(src_dir, enc_filename, key_filename)]
+        )
+        if del_toggle:
+            for filename, _ in members:
+                remove(filename)
+        return enc_filename, key_filename
+
+    def index(self):
+        """
+        Return the members of the container, decrypting the index on first
+        use
+
+        :return: Dictionary of member name to tuple of offset and size
+        :rtype: dict
+        :raises ValueError: If the file is not a container or the key is
+            wrong
+        """
+        if self._index is None:
+            with open(self.filename, "rb") as c:
+                if getsize(self.filename) < FOOTER.size:
+                    raise ValueError(f"{bn(self.filename)} is not a container")
+                c.seek(-FOOTER.size, 2)
+                magic, offset, length = FOOTER.unpack(c.read(FOOTER.size))
+                if magic != MAGIC:
+                    raise ValueError(f"{bn(self.filename)} is not a container")
+                c.seek(offset)
+                index = c.read(length)
+            with open(self.key_file, "rb") as k:
+                k.seek(self.key_offset + offset)
+                key = k.read(length)
+            if len(index) != length or len(key) != length:
+                raise ValueError("Wrong key or damaged container")
+            self._index = Container._parse_index(StreamCipher.xor(index, key))
+        return self._index
+
+    def members(self):
+        """
+        Return the names and sizes of the members, in packing order
+
+        :return: List of tuples of member name and size
+        :rtype: list
+        """
+        return [(name, size) for name, (_, size) in self.index().items()]
+
+    @staticmethod
+    def _out_name(name, file_dir):
+        """
+        Return where the member `name` is extracted to below `file_dir`
+
+        :param name: Member name
+        :type name: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :return: Filename
+        :rtype: str
+        :raises ValueError: If `name` would leave `file_dir`
+        """
+        parts = name.split("/")
+        if isabs(name) or ".." in parts or "" in parts:
+            raise ValueError(f"Unsafe member name: {name}")
+        return join(file_dir, *parts)
+
+    def extract(self, name, file_dir="", chunk_size=CHUNK_SIZE, group=None):
+        """
+        Decrypt the member `name` into `file_dir`, reading only its own
+        bytes, and return the decrypted filename
+
+        Directories in the member name are recreated, and a name that is
+        taken gets a suffix (see `StreamCipher._claim_name`). Without the
+        sync group `group`, the file is made durable before returning.
+
+        :param name: Member name
+        :type name: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :param chunk_size: Number of bytes read at a time
+        :type chunk_size: int
+        :param group: Sync group
+        :type group: durable.SyncGroup
+        :return: Decrypted filename
+        :rtype: str
+        :raises KeyError: If there is no member `name`
+        """
+        offset, size = self.index()[name]
+        dec_file = Container._out_name(name, file_dir)
+        makedirs(dirname(dec_file) or ".", exist_ok=True)
+        dec_file = StreamCipher._claim_name(dec_file)
+        temp = temp_name(dec_file)
+        try:
+            with open(self.filename, "rb") as c, \
+                    open(self.key_file, "rb") as k, open(temp, "wb") as o:
+                c.seek(offset)
+                k.seek(self.key_offset + offset)
+                Container._xor_copy(c, k, o, size, chunk_size)
+        except BaseException:
+            discard(temp)
+            discard(dec_file)
+            raise
+        own = group is None
+        if own:
+            group = SyncGroup()
+        group.add(dec_file, temp)
+        if own:
+            group.commit()
+        return dec_file
+
+    def extract_all(
+        self,
+        file_dir="",
+        log_dir="",
+        del_toggle=False,
+        chunk_size=CHUNK_SIZE,
+        sync_every=SYNC_GROUP
+    ):
+        """
+        Decrypt every member into `file_dir`
+
+        The outputs are made durable in group commits of `sync_every`
+        files, and only then are the container, its key and its log entry
+        deleted if `del_toggle` is set.
+
+        :param file_dir: File directory
+        :type file_dir: str
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param del_toggle: Delete files option
+        :type del_toggle: bool
+        :param chunk_size: Number of bytes read at a time
+        :type chunk_size: int
+        :param sync_every: Number of files per group commit
+        :type sync_every: int
+        :return: Decrypted filenames
+        :rtype: list
+        """
+        group = SyncGroup(sync_every)
+        dec_files = [
+            self.extract(name, file_dir, chunk_size, group)
+            for name in self.index()
+        ]
+        group.commit()
+        if del_toggle:
+            StreamCipher._remove_inputs(self.filename, self.key_ref)
+            StreamCipher._remove_log_entries(log_dir, [self.filename])
+        return dec_files
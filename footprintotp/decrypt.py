@@ -1,11 +1,15 @@
 from os.path import dirname, join, exists
-from json import loads
-from time import time, strftime, gmtime
 from gi import require_versions
 require_versions({"Gtk": "4.0", "Adw": "1"})
 from gi.repository import Gtk, Gio
 from . import *
-from .stream_cipher import StreamCipher
+from .config import settings
+from .log_store import LogStore
+from .pad import parse_key_ref
+from .profiling import profiled
+from .progress import Progress
+from .stats import Stats
+from .stream_cipher import StreamCipher, Cancelled
 
 
 class Decrypt(Gtk.Box):
@@ -23,10 +27,8 @@ class Decrypt(Gtk.Box):
 
         self.win = window
 
-        # Open stored preferences
-        self.config = loads(
-            open(join(CONF, "settings.json"), "r").read()
-        )
+        # Stored preferences
+        self.config = settings
 
         # Set up grid
         spacing = 20
@@ -65,11 +67,14 @@ class Decrypt(Gtk.Box):
         reset_button = Gtk.Button(label="Reset")
         reset_button.connect("clicked", self.win.reset)
 
+        # Progress bar and cancel button
+        self.progress = Progress()
+
         # Decrypt button
-        decrypt_button = Gtk.Button(
+        self.decrypt_button = Gtk.Button(
             label="Decrypt", hexpand=True, vexpand=True
         )
-        decrypt_button.connect("clicked", self.on_decrypt_clicked)
+        self.decrypt_button.connect("clicked", self.on_decrypt_clicked)
 
         # Attach widgets to grid
         widgets = [
@@ -81,7 +86,8 @@ class Decrypt(Gtk.Box):
             [self.dir],
             [self.del_toggle],
             [reset_button],
-            [decrypt_button]
+            [self.progress],
+            [self.decrypt_button]
         ]
         for i in range(len(widgets)):
             width = max(len(row) for row in widgets) // len(widgets[i])
@@ -144,18 +150,14 @@ class Decrypt(Gtk.Box):
             filename = Gio.File.get_path(dialog.get_file())
             self.file.set_text(filename)
             # Attempt to find key file
-            log = open(join(DATA, "otp.log"), "r").readlines()
-            bn_log = [bn(line[:-1]) for line in log]
-            try:
-                key_ind = bn_log.index(bn(filename)) + 1
-                if exists(join(self.config["keys"], bn_log[key_ind])):
-                    self.key.set_text(
-                        join(self.config["keys"], bn_log[key_ind])
-                    )
-                elif exists(log[key_ind][:-1]):
-                    self.key.set_text(exists(log[key_ind][:-1]))
-            except ValueError:
-                pass
+            entry = LogStore(DATA).find(filename)
+            if entry is not None:
+                key = entry[2]
+                if exists(join(self.config["keys"], bn(key))):
+                    self.key.set_text(join(self.config["keys"], bn(key)))
+                elif exists(parse_key_ref(key)[0]):
+                    # Plain key elsewhere or a shared pad segment
+                    self.key.set_text(key)
             # Set save location to same as chosen file
             if self.dir.get_text() == "":
                 self.dir.set_text(dirname(filename))
@@ -244,7 +246,7 @@ class Decrypt(Gtk.Box):
 
     def _decrypt_file(self):
         """
-        Decrypt the file
+        Start decrypting the file on a worker thread
         """
         file = self.file.get_text()
         key = self.key.get_text()
@@ -255,19 +257,31 @@ class Decrypt(Gtk.Box):
         else:
             outdir = dirname(file)
         del_toggle = self.del_toggle.get_active()
-        start = time()
-        d = StreamCipher.decrypt_file(
-            file,
-            key,
-            outdir,
-            DATA,
-            del_toggle
+        self.decrypt_button.set_sensitive(False)
+        self.stats = Stats()
+        decrypt_file = StreamCipher.decrypt_file
+        # Debug mode also writes a profiling report of every run
+        if self.config["dbug"]:
+            decrypt_file = profiled(decrypt_file, "decrypt")
+        self.progress.start(
+            decrypt_file,
+            (file, key, outdir, DATA, del_toggle),
+            {"stats": self.stats},
+            self._decrypted,
+            self._failed
         )
-        elapsed = time() - start
-        elapsed = strftime("%H:%M:%S", gmtime(elapsed))
+
+    def _decrypted(self, d):
+        """
+        Show the decrypted file once decryption has finished
+        
+        :param d: Decrypted filename
+        :type d: str
+        """
+        self.decrypt_button.set_sensitive(True)
         d = lnbr(bn(d))
         dec_msg = f"<b>Decrypted</b>\n{d}"
-        time_msg = f"<b>Time</b>\n{elapsed}"
+        time_msg = f"<b>Time</b>\n{self.stats.report()}"
         msg = f"{dec_msg}\n{time_msg}"
         dialog = Gtk.MessageDialog(
             transient_for=self.win,
@@ -286,6 +300,35 @@ class Decrypt(Gtk.Box):
         dialog.connect("response", self._confirm)
         dialog.show()
 
+    def _failed(self, error):
+        """
+        Report a decryption that was cancelled or failed
+        
+        :param error: Exception raised by the decryption
+        :type error: Exception
+        """
+        self.decrypt_button.set_sensitive(True)
+        if self.config["dbug"] and not isinstance(error, Cancelled):
+            raise error
+        dialog = Gtk.MessageDialog(
+            transient_for=self.win,
+            modal=True,
+            message_type=Gtk.MessageType.INFO,
+            buttons=Gtk.ButtonsType.OK
+        )
+        dialog.set_titlebar(Gtk.HeaderBar(show_title_buttons=False))
+        if isinstance(error, Cancelled):
+            # Keep the chosen files so the decryption can be restarted
+            dialog.set_markup("Decryption cancelled")
+            dialog.connect("response", self._dismiss)
+        else:
+            if isinstance(error, FileNotFoundError):
+                dialog.set_markup("File not found")
+            else:
+                dialog.set_markup("Invalid file combination")
+            dialog.connect("response", self._confirm)
+        dialog.show()
+
     def on_decrypt_clicked(self, button):
         """
         Decrypt the user-selected file and save to the user-selected
@@ -294,27 +337,20 @@ class Decrypt(Gtk.Box):
         :param button: Decrypt button
         :type button: Gtk.Button
         """
-        config = loads(open(join(CONF, "settings.json"), "r").read())
-        if not config["dbug"]:
-            dialog = Gtk.MessageDialog(
-                transient_for=self.win,
-                modal=True,
-                message_type=Gtk.MessageType.INFO,
-                buttons=Gtk.ButtonsType.OK
-            )
-            dialog.set_titlebar(Gtk.HeaderBar(show_title_buttons=False))
-            dialog.connect("response", self._confirm)
-            try:
-                self._decrypt_file()
-            except FileNotFoundError:
-                dialog.set_markup("File not found")
-                dialog.show()
-            except Exception:
-                dialog.set_markup("Invalid file combination")
-                dialog.show()
-        else:
+        if not self.progress.running():
             self._decrypt_file()
 
+    def _dismiss(self, dialog, response):
+        """
+        Close the dialog without resetting the window
+        
+        :param dialog: Dialog
+        :type dialog: Gtk.Dialog
+        :param response: Response from user
+        :type response: int
+        """
+        dialog.destroy()
+
     def _confirm(self, dialog, response):
         """
         Close upon confirming
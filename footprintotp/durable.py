@@ -0,0 +1,177 @@
+from os import fsync, replace, remove, open as os_open, close, O_RDONLY
+from os import urandom
+from os import name as os_name
+from os.path import abspath, dirname, exists, join
+from threading import Lock
+from . import bn
+
+# Longest file name most file systems allow, in bytes
+NAME_MAX = 255
+# Number of random hex digits in temporary file names
+TEMP_DIGITS = 8
+# Number of bytes temporary file names add to the name they are made from
+TEMP_EXTRA = len(f"..{'0' * TEMP_DIGITS}.part")
+# Number of files written by a batch between two group commits
+SYNC_GROUP = 64
+# Number of threads issuing the fsyncs of a group commit
+SYNC_THREADS = 8
+
+
+def temp_name(filename):
+    """
+    Return an unused hidden name next to `filename` to write it under
+    before it is renamed into place
+
+    The base name of `filename` is shortened if needed, so that the
+    temporary name is no longer than `NAME_MAX` bytes whenever `filename`
+    is not.
+
+    :param filename: Filename
+    :type filename: str
+    :return: Temporary filename
+    :rtype: str
+    """
+    # secrets would load base64, hashlib and random on every start
+    suffix = urandom(TEMP_DIGITS // 2).hex()
+    name = bn(filename).encode()[:NAME_MAX - TEMP_EXTRA]
+    # Cutting through a multi-byte character drops the partial character
+    name = name.decode(errors="ignore")
+    return join(dirname(filename), f".{name}.{suffix}.part")
+
+
+def discard(filename):
+    """
+    Remove the temporary file `filename` if it is there
+
+    :param filename: Filename
+    :type filename: str
+    """
+    if exists(filename):
+        remove(filename)
+
+
+def fsync_file(filename):
+    """
+    Flush the data of `filename` to disk
+
+    :param filename: Filename
+    :type filename: str
+    """
+    # Windows only flushes files opened for writing
+    with open(filename, "r+b") as f:
+        fsync(f.fileno())
+
+
+def fsync_dir(directory):
+    """
+    Flush the entries of `directory` to disk, so that files created or
+    renamed in it survive a crash
+
+    Directories cannot be opened on Windows, where renames are flushed with
+    their files.
+
+    :param directory: Directory
+    :type directory: str
+    """
+    if os_name == "nt":
+        return
+    fd = os_open(directory or ".", O_RDONLY)
+    try:
+        fsync(fd)
+    finally:
+        close(fd)
+
+
+class SyncGroup:
+    """
+    Files written by an operation or a batch of them, made durable together
+    by group commits
+
+    A file is added either in place or as a temporary file to be renamed
+    over it. A commit flushes the data of every added file, renames the
+    temporary files into place, then flushes each of their directories
+    once, so that a batch costs one directory flush per `size` files rather
+    than one per file. The file flushes are issued from several threads,
+    which lets the file system fold them into fewer journal commits.
+
+    Once a commit has failed, every later commit raises too, so that no
+    caller deletes sources whose output may not have been written.
+
+    :param size: Number of added files that triggers a commit, or None to
+        only commit when `commit` is called
+    :type size: int
+    """
+    def __init__(self, size=None):
+        """
+        Constructor
+        """
+        self.size = size
+        self._pending = []
+        self._lock = Lock()
+        self._error = None
+
+    def add(self, filename, temp=None):
+        """
+        Add `filename`, written in place or under the temporary name `temp`,
+        committing the group if it is full
+
+        :param filename: Filename
+        :type filename: str
+        :param temp: Temporary filename, see `temp_name`
+        :type temp: str
+        """
+        with self._lock:
+            self._pending.append((filename, temp))
+            full = self.size is not None and len(self._pending) >= self.size
+        if full:
+            self.commit()
+
+    def commit(self):
+        """
+        Make every added file durable
+
+        :raises OSError: If this or an earlier commit failed
+        """
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                self._commit(pending)
+            except OSError as e:
+                self._error = e
+                raise
+
+    def discard(self):
+        """
+        Drop every file added since the last commit, removing those written
+        under a temporary name
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for _, temp in pending:
+            if temp is not None:
+                discard(temp)
+
+    @staticmethod
+    def _commit(pending):
+        """
+        Flush, rename and flush the directories of `pending`
+
+        :param pending: List of tuples of filename and temporary filename
+        :type pending: list
+        """
+        files = [temp or filename for filename, temp in pending]
+        if len(files) == 1:
+            fsync_file(files[0])
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(min(SYNC_THREADS, len(files))) as pool:
+                list(pool.map(fsync_file, files))
+        for filename, temp in pending:
+            if temp is not None:
+                replace(temp, filename)
+        for directory in {dirname(abspath(f)) for f, _ in pending}:
+            fsync_dir(directory)
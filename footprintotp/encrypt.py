@@ -1,11 +1,15 @@
-from os.path import dirname, join, exists
-from json import loads
-from time import time, strftime, gmtime
+from os.path import dirname, exists, getsize
+from threading import Thread
 from gi import require_versions
 require_versions({"Gtk": "4.0", "Adw": "1"})
-from gi.repository import Gtk, Gio
+from gi.repository import Gtk, Gio, GLib
 from . import *
-from .stream_cipher import StreamCipher
+from .config import settings
+from .keygen import KeyGen
+from .profiling import profiled
+from .progress import Progress
+from .stats import Stats
+from .stream_cipher import StreamCipher, Cancelled
 
 
 class Encrypt(Gtk.Box):
@@ -23,10 +27,8 @@ class Encrypt(Gtk.Box):
 
         self.win = window
 
-        # Open stored preferences
-        self.config = loads(
-            open(join(CONF, "settings.json"), "r").read()
-        )
+        # Stored preferences
+        self.config = settings
 
         # Set up grid
         spacing = 20
@@ -50,6 +52,10 @@ class Encrypt(Gtk.Box):
         key_button.connect("clicked", self.on_key_clicked)
         self.key = Gtk.Entry()
 
+        # Generate key button
+        self.gen_button = Gtk.Button(label="Generate Key Matching File")
+        self.gen_button.connect("clicked", self.on_gen_clicked)
+
         # Save location label, button, and entry box
         dir_label = Gtk.Label(halign=Gtk.Align.START)
         dir_label.set_markup("<b>Save Location</b>")
@@ -61,15 +67,22 @@ class Encrypt(Gtk.Box):
         self.del_toggle = Gtk.CheckButton(label="Delete file upon encryption")
         self.del_toggle.set_active(False)
 
+        # Shared pad option
+        self.pad_toggle = Gtk.CheckButton(label="Use key file as a shared pad")
+        self.pad_toggle.set_active(False)
+
         # Reset button
         reset_button = Gtk.Button(label="Reset")
         reset_button.connect("clicked", self.win.reset)
 
+        # Progress bar and cancel button
+        self.progress = Progress()
+
         # Encrypt button
-        encrypt_button = Gtk.Button(
+        self.encrypt_button = Gtk.Button(
             label="Encrypt", hexpand=True, vexpand=True
         )
-        encrypt_button.connect("clicked", self.on_encrypt_clicked)
+        self.encrypt_button.connect("clicked", self.on_encrypt_clicked)
 
         # Attach widgets to grid
         widgets = [
@@ -77,11 +90,14 @@ class Encrypt(Gtk.Box):
             [self.file],
             [key_label, key_button],
             [self.key],
+            [self.gen_button],
             [dir_label, dir_button],
             [self.dir],
             [self.del_toggle],
+            [self.pad_toggle],
             [reset_button],
-            [encrypt_button]
+            [self.progress],
+            [self.encrypt_button]
         ]
         for i in range(len(widgets)):
             width = max(len(row) for row in widgets) // len(widgets[i])
@@ -166,6 +182,93 @@ class Encrypt(Gtk.Box):
             self.key.set_text(Gio.File.get_path(dialog.get_file()))
         dialog.destroy()
 
+    def on_gen_clicked(self, button):
+        """
+        Generate a key the size of the chosen file in a background thread
+        
+        :param button: Generate key button
+        :type button: Gtk.Button
+        """
+        file = self.file.get_text()
+        if not exists(file):
+            self._show_error("File not found")
+            return
+        button.set_sensitive(False)
+        button.set_label("Generating Key...")
+        Thread(
+            target=self._generate_key,
+            args=(getsize(file), self.config["keys"]),
+            daemon=True
+        ).start()
+
+    def _generate_key(self, size, keys_dir):
+        """
+        Generate a key then hand the result back to the main loop
+        
+        :param size: Number of bytes
+        :type size: int
+        :param keys_dir: Keys directory
+        :type keys_dir: str
+        """
+        try:
+            key_file = KeyGen.generate(size, keys_dir)
+        except Exception as e:
+            # Anything escaping the thread would leave the button disabled
+            GLib.idle_add(
+                self._key_generated, None, str(e) or type(e).__name__
+            )
+        else:
+            GLib.idle_add(self._key_generated, key_file, None)
+
+    def _key_generated(self, key_file, error):
+        """
+        Set the key file once generated, or report the error
+        
+        :param key_file: Key filename
+        :type key_file: str
+        :param error: Error message
+        :type error: str
+        :return: False to run only once
+        :rtype: bool
+        """
+        self.gen_button.set_sensitive(True)
+        self.gen_button.set_label("Generate Key Matching File")
+        if key_file is not None:
+            self.key.set_text(key_file)
+        else:
+            error = GLib.markup_escape_text(error)
+            self._show_error(f"Key generation failed\n{error}")
+        return False
+
+    def _show_error(self, markup):
+        """
+        Show a message dialog with markup `markup`
+        
+        :param markup: Message
+        :type markup: str
+        """
+        dialog = Gtk.MessageDialog(
+            transient_for=self.win,
+            modal=True,
+            message_type=Gtk.MessageType.INFO,
+            buttons=Gtk.ButtonsType.OK
+        )
+        dialog.set_titlebar(Gtk.HeaderBar(show_title_buttons=False))
+        dialog.set_markup(markup)
+        dialog.connect("response", self._dismiss)
+        dialog.show()
+
+    def _dismiss(self, dialog, response):
+        """
+        Close the dialog without resetting the window
+        
+        :param dialog: Dialog
+        :type dialog: Gtk.Dialog
+        :param response: Response from user
+        :type response: int
+        """
+        dialog.destroy()
+
     def on_dir_clicked(self, button):
         """
         Open a dialog for user to select directory
@@ -213,34 +316,53 @@ class Encrypt(Gtk.Box):
 
     def _encrypt_file(self):
         """
-        Encrypt the file
+        Start encrypting the file on a worker thread
         """
         file = self.file.get_text()
         key = self.key.get_text()
         if self.dir.get_text() != "":
-            dirname = self.dir.get_text()
+            out_dir = self.dir.get_text()
         elif self.config["save"] != "":
-            dirname = self.config["save"]
+            out_dir = self.config["save"]
         else:
-            dirname = dirname(file)
+            out_dir = dirname(file)
         del_toggle = self.del_toggle.get_active()
-        start = time()
-        e, k = StreamCipher.encrypt_file(
-            file,
-            key,
-            dirname,
-            self.config["keys"],
-            DATA,
-            self.config["encf"],
-            del_toggle
+        self.encrypt_button.set_sensitive(False)
+        self.stats = Stats()
+        encrypt_file = StreamCipher.encrypt_file
+        # Debug mode also writes a profiling report of every run
+        if self.config["dbug"]:
+            encrypt_file = profiled(encrypt_file, "encrypt")
+        self.progress.start(
+            encrypt_file,
+            (
+                file,
+                key,
+                out_dir,
+                self.config["keys"],
+                DATA,
+                self.config["encf"],
+                del_toggle
+            ),
+            {"pad": self.pad_toggle.get_active(), "stats": self.stats},
+            self._encrypted,
+            self._failed
         )
-        elapsed = time() - start
-        elapsed = strftime("%H:%M:%S", gmtime(elapsed))
+
+    def _encrypted(self, result):
+        """
+        Show the encrypted file and key once encryption has finished
+        
+        :param result: Tuple of encrypted filename and key filename
+        :type result: tuple
+        """
+        self.encrypt_button.set_sensitive(True)
+        e, k = result
         e = lnbr(bn(e))
         k = lnbr(bn(k))
         enc_msg = f"<b>Encrypted</b>\n{e}"
         key_msg = f"<b>Key</b>\n{k}"
-        time_msg = f"<b>Time</b>\n{elapsed}"
+        time_msg = f"<b>Time</b>\n{self.stats.report()}"
         msg = f"{enc_msg}\n{key_msg}\n{time_msg}"
         dialog = Gtk.MessageDialog(
             transient_for=self.win,
@@ -259,6 +381,36 @@ class Encrypt(Gtk.Box):
         dialog.connect("response", self._confirm)
         dialog.show()
 
+    def _failed(self, error):
+        """
+        Report an encryption that was cancelled or failed
+        
+        :param error: Exception raised by the encryption
+        :type error: Exception
+        """
+        self.encrypt_button.set_sensitive(True)
+        if isinstance(error, Cancelled):
+            self._show_error("Encryption cancelled")
+            return
+        if self.config["dbug"]:
+            raise error
+        dialog = Gtk.MessageDialog(
+            transient_for=self.win,
+            modal=True,
+            message_type=Gtk.MessageType.INFO,
+            buttons=Gtk.ButtonsType.OK
+        )
+        dialog.set_titlebar(Gtk.HeaderBar(show_title_buttons=False))
+        dialog.connect("response", self._confirm)
+        if isinstance(error, FileNotFoundError):
+            dialog.set_markup("File not found")
+        elif isinstance(error, ValueError):
+            # The key or pad is too short for the file
+            dialog.set_markup(GLib.markup_escape_text(str(error)))
+        else:
+            dialog.set_markup("Unknown error")
+        dialog.show()
+
     def on_encrypt_clicked(self, button):
         """
         Encrypt the user-selected file and save to the user-selected
@@ -267,25 +419,7 @@ class Encrypt(Gtk.Box):
         :param button: Encrypt button
         :type button: Gtk.Button
         """
-        config = loads(open(join(CONF, "settings.json"), "r").read())
-        if not config["dbug"]:
-            dialog = Gtk.MessageDialog(
-                transient_for=self.win,
-                modal=True,
-                message_type=Gtk.MessageType.INFO,
-                buttons=Gtk.ButtonsType.OK
-            )
-            dialog.set_titlebar(Gtk.HeaderBar(show_title_buttons=False))
-            dialog.connect("response", self._confirm)
-            try:
-                self._encrypt_file()
-            except FileNotFoundError:
-                dialog.set_markup("File not found")
-                dialog.show()
-            except Exception:
-                dialog.set_markup("Unknown error")
-                dialog.show()
-        else:
+        if not self.progress.running():
             self._encrypt_file()
 
     def _confirm(self, dialog, response):
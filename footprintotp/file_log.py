@@ -1,10 +1,102 @@
 from os import remove
-from os.path import dirname, join, exists
+from os.path import dirname
 from platform import system
 from gi import require_versions
 require_versions({"Gtk": "4.0", "Adw": "1"})
-from gi.repository import Gtk
+from gi.repository import Gtk, Gio, GLib, GObject
 from . import *
+from .log_store import LogStore
+from .pad import parse_key_ref
+
+# Number of entries fetched from the log at a time
+PAGE_SIZE = 100
+# Number of fetched pages kept in memory
+PAGES = 16
+# Milliseconds without typing after which the log is searched
+SEARCH_DELAY = 300
+
+
+class LogItem(GObject.Object):
+    """
+    Entry of the file log
+
+    :param entry: Tuple of filename, encrypted filename, key filename and
+        time
+    :type entry: tuple
+    """
+    def __init__(self, entry):
+        """
+        Constructor
+        """
+        super().__init__()
+        self.entry = entry
+
+
+class LogModel(GObject.Object, Gio.ListModel):
+    """
+    List model of the file log that only holds the number of entries,
+    fetching entries a page at a time as they are shown
+
+    Each page is fetched from the last entry of the page before it when
+    that one is known, as it is while scrolling, and otherwise by its
+    position.
+
+    :param log: Log store
+    :type log: log_store.LogStore
+    """
+    def __init__(self, log):
+        """
+        Constructor
+        """
+        super().__init__()
+        self.log = log
+        self.prefix = ""
+        self.n_items = log.count()
+        self._pages = {}
+        # Id of the last entry of each page fetched
+        self._ends = {}
+
+    def do_get_item_type(self):
+        return LogItem.__gtype__
+
+    def do_get_n_items(self):
+        return self.n_items
+
+    def do_get_item(self, position):
+        if position >= self.n_items:
+            return None
+        page = position // PAGE_SIZE
+        if page not in self._pages:
+            if len(self._pages) >= PAGES:
+                # Dictionaries keep insertion order, so this is the oldest
+                self._pages.pop(next(iter(self._pages)))
+            rows = self.log.page(
+                PAGE_SIZE,
+                page * PAGE_SIZE,
+                self._ends.get(page - 1),
+                self.prefix
+            )
+            if rows:
+                self._ends[page] = rows[-1][0]
+            # Entries removed by another process leave blank rows
+            rows += [(None, "", "", "", "")] * (PAGE_SIZE - len(rows))
+            self._pages[page] = [LogItem(row[1:]) for row in rows]
+        return self._pages[page][position % PAGE_SIZE]
+
+    def filter(self, prefix):
+        """
+        Show only the entries with a filename, encrypted filename or key
+        filename starting with `prefix`
+
+        :param prefix: Base name prefix
+        :type prefix: str
+        """
+        removed = self.n_items
+        self.prefix = prefix
+        self.n_items = self.log.count(prefix)
+        self._pages = {}
+        self._ends = {}
+        self.items_changed(0, removed, self.n_items)
 
 
 class FileLog(Gtk.Window):
@@ -51,31 +143,35 @@ class FileLog(Gtk.Window):
             column_spacing=spacing
         )
 
-        # Scrolled window of files
-        self.store = Gtk.ListStore(str, str, str, str)
-        log_file = join(DATA, "otp.log")
-        if not exists(log_file):
-            open(log_file, "w").close()
-            log = []
-        else:
-            log = open(log_file).readlines()
-        for i in range(len(log) // 5):
-            file = lnbr(bn(log[i * 5][:-1]), 32)
-            enc = lnbr(bn(log[i * 5 + 1][:-1]), 32)
-            key = lnbr(bn(log[i * 5 + 2][:-1]), 32)
-            encd = lnbr(log[i * 5 + 3][:-1], 32)
-            self.store.append([file, enc, key, encd])
-        self.tree = Gtk.TreeView(model=self.store)
-        self.tree.connect("cursor-changed", self.on_selection)
+        # Search box
+        self.search = Gtk.SearchEntry(
+            placeholder_text="Search by file, encrypted file or key name"
+        )
+        self.search.connect("changed", self.on_search_changed)
+        self._search_source = None
+
+        # Scrolled list of files, whose rows are only built when shown
+        self.model = LogModel(LogStore(DATA))
+        self.selection = Gtk.SingleSelection(
+            model=self.model,
+            autoselect=False
+        )
+        self.selection.connect("notify::selected", self.on_selection)
+        self.view = Gtk.ColumnView(model=self.selection)
         cols = ["File", "Encrypted", "Key", "Time"]
         for i in range(len(cols)):
-            col = Gtk.TreeViewColumn(
-                cols[i], Gtk.CellRendererText(), text=i
+            factory = Gtk.SignalListItemFactory()
+            factory.connect("setup", self._setup_cell)
+            factory.connect("bind", self._bind_cell, i)
+            col = Gtk.ColumnViewColumn(
+                title=cols[i],
+                factory=factory,
+                expand=True
             )
-            self.tree.append_column(col)
+            self.view.append_column(col)
         scroll = Gtk.ScrolledWindow()
         scroll.set_size_request(width=800, height=400)
-        scroll.set_child(self.tree)
+        scroll.set_child(self.view)
 
         # Delete button
         delete_button = Gtk.Button(label="Delete Entry")
@@ -89,6 +185,7 @@ class FileLog(Gtk.Window):
 
         # Attach widgets to grid
         widgets = [
+            [self.search],
             [scroll],
             [delete_button, select_button]
         ]
@@ -100,12 +197,49 @@ class FileLog(Gtk.Window):
         # Add grid
         self.set_child(grid)
 
-    def on_selection(self, widget):
-        selection = self.tree.get_selection()
-        _, treeiter = selection.get_selected()
-        self.name, self.file, self.key, self.time = [
-            item.replace("\n", "") for item in self.store[treeiter][:]
-        ]
+    def _setup_cell(self, factory, list_item):
+        list_item.set_child(Gtk.Label(xalign=0))
+
+    def _bind_cell(self, factory, list_item, column):
+        text = list_item.get_item().entry[column]
+        # Paths are shortened to their base names, the time is kept whole
+        if column < 3:
+            text = bn(text)
+        list_item.get_child().set_text(lnbr(text, 32))
+
+    def on_selection(self, selection, pspec):
+        item = selection.get_selected_item()
+        if item is None:
+            self.name, self.file, self.key, self.time = None, None, None, None
+        else:
+            self.name, self.file, self.key, self.time = item.entry
+
+    def on_search_changed(self, entry):
+        """
+        Filter the log by the text of the search box once typing pauses for
+        `SEARCH_DELAY` milliseconds
+
+        :param entry: Search box
+        :type entry: Gtk.SearchEntry
+        """
+        if self._search_source is not None:
+            GLib.source_remove(self._search_source)
+        self._search_source = GLib.timeout_add(
+            SEARCH_DELAY, self._search, entry
+        )
+
+    def _search(self, entry):
+        """
+        Filter the log by the text of the search box
+
+        :param entry: Search box
+        :type entry: Gtk.SearchEntry
+        :return: False, so that the timeout is not repeated
+        :rtype: bool
+        """
+        self._search_source = None
+        self.model.filter(entry.get_text().strip())
+        return False
 
     def on_delete_clicked(self, button):
         """
@@ -126,7 +260,7 @@ class FileLog(Gtk.Window):
                 "_OK", Gtk.ResponseType.OK
             )
             dialog.set_markup("<big><b>Confirm deletion</b></big>")
-            msg = f"Delete entry for <b>{self.name}</b>?"
+            msg = f"Delete entry for <b>{bn(self.name)}</b>?"
             spacing = 20
             label = Gtk.Label(
                 label=msg,
@@ -154,15 +288,11 @@ class FileLog(Gtk.Window):
         :type button: Gtk.Button
         """
         if self.file is not None:
-            log = open(join(DATA, "otp.log"), "r").readlines()
-            bn_log = [bn(line[:-1]) for line in log]
-            filename = log[bn_log.index(self.file)][:-1]
-            key = log[bn_log.index(self.key)][:-1]
             self.parent.stack.set_visible_child_name("decrypt")
-            self.parent.decrypt.file.set_text(filename)
-            self.parent.decrypt.key.set_text(key)
+            self.parent.decrypt.file.set_text(self.file)
+            self.parent.decrypt.key.set_text(self.key)
             if self.parent.decrypt.dir.get_text() == "":
-                self.parent.decrypt.dir.set_text(dirname(filename))
+                self.parent.decrypt.dir.set_text(dirname(self.file))
             self.destroy()
 
     def _confirm(self, dialog, response):
@@ -175,20 +305,10 @@ class FileLog(Gtk.Window):
         :type response: int
         """
         if response == Gtk.ResponseType.OK:
-            old_log = open(
-                join(DATA, "otp.log"), "r"
-            ).readlines()
-            bn_log = [bn(line[:-1]) for line in old_log]
-            if dialog.del_key.get_active():
-                remove(old_log[bn_log.index(self.key)])
-            ind = bn_log.index(self.file) - 1
-            rmv = []
-            for i in range(5):
-                rmv.append(ind + i)
-            new_log = [j for i, j in enumerate(old_log) if i not in rmv]
-            with open(join(DATA, "otp.log"), "w") as logfile:
-                for line in new_log:
-                    logfile.write(line)
-                logfile.close()
+            key_file, key_offset = parse_key_ref(self.key)
+            # Shared pads hold other segments, so they are never deleted
+            if dialog.del_key.get_active() and key_offset is None:
+                remove(key_file)
+            self.model.log.remove([self.file])
             self.destroy()
         dialog.destroy()
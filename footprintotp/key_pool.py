@@ -0,0 +1,134 @@
+from bisect import bisect_left
+from collections import deque
+from os import listdir, makedirs, rename
+from os.path import join
+from threading import Event, Thread, get_native_id
+from .keygen import KeyGen
+
+
+class KeyPool:
+    """
+    Keys generated ahead of time so that encryption does not wait for them
+
+    `count` keys of each size in `sizes` are kept in `pool/<size>` inside
+    the keys directory and refilled by a background thread. A key is
+    claimed by renaming it out of the pool, which succeeds for only one
+    caller even across processes, so a key is never handed out twice.
+
+    :param keys_dir: Keys directory
+    :type keys_dir: str
+    :param sizes: Key sizes in bytes
+    :type sizes: list
+    :param count: Number of keys to keep of each size
+    :type count: int
+    :param workers: Number of threads generating each key
+    :type workers: int
+    """
+    def __init__(self, keys_dir, sizes, count=1, workers=1):
+        """
+        Constructor
+        """
+        self.keys_dir = keys_dir
+        self.pool_dir = join(keys_dir, "pool")
+        self.sizes = sorted(set(sizes))
+        self.count = count
+        self.workers = workers
+        self._ready = {}
+        self._wake = Event()
+        self._stop = Event()
+        self._thread = None
+        for size in self.sizes:
+            size_dir = join(self.pool_dir, str(size))
+            makedirs(size_dir, exist_ok=True)
+            self._ready[size] = deque()
+            for name in listdir(size_dir):
+                # Keys still being written start with a dot
+                if not name.startswith("."):
+                    self._ready[size].append(name)
+
+    def available(self, size):
+        """
+        Return the number of ready keys of exactly `size` bytes
+
+        :param size: Key size
+        :type size: int
+        :return: Number of ready keys
+        :rtype: int
+        """
+        return len(self._ready.get(size, ()))
+
+    def claim(self, size):
+        """
+        Move the smallest ready key of at least `size` bytes into the keys
+        directory and return its filename
+
+        If no such key is ready, a key of exactly `size` bytes is generated
+        on the spot instead.
+
+        :param size: Minimum key size
+        :type size: int
+        :return: Key filename
+        :rtype: str
+        """
+        for pool_size in self.sizes[bisect_left(self.sizes, size):]:
+            ready = self._ready[pool_size]
+            while True:
+                try:
+                    name = ready.popleft()
+                except IndexError:
+                    break
+                key_file = join(self.keys_dir, name)
+                try:
+                    rename(join(self.pool_dir, str(pool_size), name), key_file)
+                except FileNotFoundError:
+                    # Claimed by another process sharing the pool
+                    continue
+                self._wake.set()
+                return key_file
+        self._wake.set()
+        return KeyGen.generate(size, self.keys_dir, workers=self.workers)
+
+    def start(self):
+        """
+        Start the background thread that keeps the pool full
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = Thread(target=self._refill, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread once the key in progress is written
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    def _refill(self):
+        """
+        Generate keys until every size has `count` ready keys, then sleep
+        until a key is claimed
+        """
+        try:
+            # On Linux this lowers the priority of this thread only
+            from os import setpriority, PRIO_PROCESS
+            setpriority(PRIO_PROCESS, get_native_id(), 19)
+        except (ImportError, OSError):
+            pass
+        while not self._stop.is_set():
+            self._wake.clear()
+            for size in self.sizes:
+                size_dir = join(self.pool_dir, str(size))
+                while len(self._ready[size]) < self.count:
+                    if self._stop.is_set():
+                        return
+                    name = KeyGen.key_name()
+                    KeyGen.generate(
+                        size, size_dir, f".{name}", self.workers
+                    )
+                    rename(join(size_dir, f".{name}"), join(size_dir, name))
+                    self._ready[size].append(name)
+            self._wake.wait()
@@ -0,0 +1,140 @@
+from os import remove, urandom, cpu_count, open as os_open, close, O_WRONLY
+from os.path import join
+from secrets import token_urlsafe
+from .durable import NAME_MAX
+from .stream_cipher import CHUNK_SIZE, pwrite
+
+# Longest base name, in bytes, whose encrypted name fits in `NAME_MAX`:
+# base64 turns every 3 bytes into 4 characters, followed by ".otp"
+ENC_NAME_MAX = (NAME_MAX - len(".otp")) // 4 * 3
+# Number of random bytes of generated key names, whose base64 text is then
+# at least `ENC_NAME_MAX` characters long, 187 characters that still leave
+# room for the temporary names they are written under
+NAME_BYTES = -(-ENC_NAME_MAX * 3 // 4)
+
+
+class KeyGen:
+
+    @staticmethod
+    def key_name():
+        """
+        Return a new random key filename
+
+        Encrypted filenames are XORed with the key filename, so the name is
+        long enough to cover, without repeating, any filename whose
+        encrypted name the file system allows, see `ENC_NAME_MAX`.
+
+        :return: Key filename
+        :rtype: str
+        """
+        return token_urlsafe(NAME_BYTES)
+
+    @staticmethod
+    def _fill_range(key_file, start, end, chunk_size):
+        """
+        Write random bytes from `start` to `end` of `key_file`
+
+        :param key_file: Key filename
+        :type key_file: str
+        :param start: First byte of the range
+        :type start: int
+        :param end: End of the range, exclusive
+        :type end: int
+        :param chunk_size: Number of bytes per request for random bytes
+        :type chunk_size: int
+        :return: Number of bytes written
+        :rtype: int
+        """
+        fd = os_open(key_file, O_WRONLY)
+        try:
+            for pos in range(start, end, chunk_size):
+                data = memoryview(urandom(min(chunk_size, end - pos)))
+                written = 0
+                while written < len(data):
+                    written += pwrite(fd, data[written:], pos + written)
+        finally:
+            close(fd)
+        return end - start
+
+    @staticmethod
+    def generate(
+        size,
+        keys_dir="",
+        name=None,
+        workers=None,
+        chunk_size=CHUNK_SIZE
+    ):
+        """
+        Write a key of `size` random bytes to `keys_dir` and return its
+        filename
+
+        Random bytes are requested from the operating system `chunk_size`
+        bytes at a time and written straight to disk, so memory use is
+        bounded by `workers` chunks. `os.urandom` releases the GIL, so the
+        ranges of the key are filled by a pool of threads. Platforms without
+        `os.pwrite` write the key sequentially.
+
+        :param size: Number of bytes
+        :type size: int
+        :param keys_dir: Keys directory
+        :type keys_dir: str
+        :param name: Key filename, or None for a random name
+        :type name: str
+        :param workers: Number of threads, or None for one per core
+        :type workers: int
+        :param chunk_size: Number of bytes per request for random bytes
+        :type chunk_size: int
+        :return: Key filename
+        :rtype: str
+        """
+        key_file = join(keys_dir, name or KeyGen.key_name())
+        # Refuse to overwrite an existing key
+        open(key_file, "xb").close()
+        try:
+            KeyGen._fill(key_file, size, workers, chunk_size)
+        except BaseException:
+            # Never leave a partly random key behind
+            remove(key_file)
+            raise
+        return key_file
+
+    @staticmethod
+    def _fill(key_file, size, workers, chunk_size):
+        """
+        Fill the empty file `key_file` with `size` random bytes
+
+        :param key_file: Key filename
+        :type key_file: str
+        :param size: Number of bytes
+        :type size: int
+        :param workers: Number of threads, or None for one per core
+        :type workers: int
+        :param chunk_size: Number of bytes per request for random bytes
+        :type chunk_size: int
+        """
+        with open(key_file, "wb") as k:
+            if pwrite is None:
+                for pos in range(0, size, chunk_size):
+                    k.write(urandom(min(chunk_size, size - pos)))
+                return
+            k.truncate(size)
+        workers = workers or cpu_count() or 1
+        if workers == 1 or size <= chunk_size:
+            KeyGen._fill_range(key_file, 0, size, chunk_size)
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        chunks = -(-size // chunk_size)
+        step = max(1, chunks // (workers * 4)) * chunk_size
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(
+                    KeyGen._fill_range,
+                    key_file,
+                    start,
+                    min(start + step, size),
+                    chunk_size
+                )
+                for start in range(0, size, step)
+            ]
+            for future in futures:
+                future.result()
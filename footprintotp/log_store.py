@@ -0,0 +1,577 @@
+from os import replace, fstat
+from os.path import join, exists, abspath
+from threading import Lock
+from time import time, ctime
+from . import bn
+
+# Columns that entries can be looked up by
+COLUMNS = ("file", "enc", "key")
+# Number of tombstones from which removed entries are compacted away
+COMPACT_THRESHOLD = 1024
+# Number of lookups by encrypted filename answered from the database after
+# which a process reads the whole log into an index, roughly as many as
+# reading it costs
+INDEX_LOOKUPS = 1000
+# Condition selecting entries that have not been removed
+LIVE = (
+    "NOT EXISTS (SELECT 1 FROM tombstones WHERE tombstones.id = entries.id)"
+)
+
+# Held while compacting the store, so only one thread does at a time
+_compacting = Lock()
+# Indexes of encrypted base names to entries by database filename, each
+# with the signature of the database when it was last brought up to date
+_indexes = {}
+_index_lock = Lock()
+# Number of lookups answered from each database since its index was last
+# up to date
+_lookups = {}
+
+
+class LogStore:
+    """
+    File log kept in an SQLite database, `otp.db` in `log_dir`
+
+    Each entry holds the original filename, the encrypted filename, the key
+    filename or pad segment reference, and the time of encryption. The
+    base names of the first three are indexed, so looking an entry up by
+    any of them does not read the whole log. Paths are stored absolute and
+    entries are matched on the whole path, so that files of the same name
+    in different directories are never confused. An `otp.log` left by older
+    versions is imported the first time the store is opened, then renamed
+    to `otp.log.old`.
+
+    Removing an entry only records a tombstone for it. Once there are
+    `COMPACT_THRESHOLD` tombstones, the removal that reaches them deletes
+    the removed entries and their tombstones in one transaction before it
+    returns, so that a short-lived process compacts the store as well.
+
+    Lookups by encrypted filename query the database until a process has
+    made `INDEX_LOOKUPS` of them, as the GUI does over a session, then use
+    an index held in memory and shared by the whole process. It is updated
+    in place by this process's writes and dropped when the database was
+    changed by another process, which is detected from its inode and the
+    change counter in its header, after which lookups query the database
+    again until it is worth reading anew.
+
+    :param log_dir: Log directory
+    :type log_dir: str
+    """
+    def __init__(self, log_dir=""):
+        """
+        Constructor
+        """
+        self.log_dir = log_dir
+        self.db_file = join(log_dir, "otp.db")
+
+    def _connect(self):
+        """
+        Open the database, creating and migrating it if needed
+
+        :return: Database connection
+        :rtype: sqlite3.Connection
+        """
+        # sqlite3 takes longer to import than the rest of the package
+        from sqlite3 import connect
+        db = connect(self.db_file, timeout=30)
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                file TEXT NOT NULL,
+                enc TEXT NOT NULL,
+                key TEXT NOT NULL,
+                time TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                enc_name TEXT NOT NULL,
+                key_name TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS file_name ON entries (file_name);
+            CREATE INDEX IF NOT EXISTS enc_name ON entries (enc_name);
+            CREATE INDEX IF NOT EXISTS key_name ON entries (key_name);
+            CREATE TABLE IF NOT EXISTS tombstones (
+                id INTEGER PRIMARY KEY
+            );
+            """
+        )
+        if exists(join(self.log_dir, "otp.log")):
+            self._migrate(db)
+        return db
+
+    def _migrate(self, db):
+        """
+        Import the entries of the text log into `db` and rename the text log
+
+        :param db: Database connection
+        :type db: sqlite3.Connection
+        """
+        log_file = join(self.log_dir, "otp.log")
+        with db:
+            # Take the write lock first so only one process imports the log
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                with open(log_file, "r") as logfile:
+                    log = logfile.read().split("\n")
+            except FileNotFoundError:
+                return
+            # Each entry is four lines followed by a blank line
+            db.executemany(
+                "INSERT INTO entries VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    self._row(*log[i:i + 3], log[i + 3])
+                    for i in range(0, len(log) - 4, 5)
+                ]
+            )
+            replace(log_file, f"{log_file}.old")
+
+    @staticmethod
+    def _row(file, enc, key, now):
+        """
+        Return the database row of an entry, with absolute paths
+
+        :param file: Filename
+        :type file: str
+        :param enc: Encrypted filename
+        :type enc: str
+        :param key: Key filename or pad segment reference
+        :type key: str
+        :param now: Time of encryption
+        :type now: str
+        :return: Row values
+        :rtype: tuple
+        """
+        file, enc, key = abspath(file), abspath(enc), abspath(key)
+        return file, enc, key, now, bn(file), bn(enc), bn(key)
+
+    def entries(self):
+        """
+        Return every entry as tuples of filename, encrypted filename, key
+        filename and time, oldest first
+
+        :return: List of log entries
+        :rtype: list
+        """
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT file, enc, key, time FROM entries "
+                f"WHERE {LIVE} ORDER BY id"
+            ).fetchall()
+        db.close()
+        return rows
+
+    @staticmethod
+    def _search(prefix):
+        """
+        Return the condition selecting the entries with a filename,
+        encrypted filename or key filename starting with `prefix`, or every
+        entry if it is empty, along with its parameters
+
+        The prefix is matched as a range on the indexed base names, so a
+        search does not read every entry.
+
+        :param prefix: Base name prefix
+        :type prefix: str
+        :return: Tuple of SQL condition and parameters
+        :rtype: tuple
+        """
+        if not prefix:
+            return LIVE, ()
+        # Every string starting with the prefix sorts in this range
+        bounds = (prefix, prefix + "\U0010ffff")
+        ids = " UNION ".join(
+            f"SELECT id FROM entries WHERE {c}_name >= ? AND {c}_name < ?"
+            for c in COLUMNS
+        )
+        return f"id IN ({ids}) AND {LIVE}", bounds * len(COLUMNS)
+
+    def count(self, prefix=""):
+        """
+        Return the number of entries, optionally only those with a
+        filename, encrypted filename or key filename starting with `prefix`
+
+        :param prefix: Base name prefix
+        :type prefix: str
+        :return: Number of entries
+        :rtype: int
+        """
+        condition, params = self._search(prefix)
+        with self._connect() as db:
+            count = db.execute(
+                f"SELECT count(*) FROM entries WHERE {condition}", params
+            ).fetchone()[0]
+        db.close()
+        return count
+
+    def page(self, limit, offset=0, after=None, prefix=""):
+        """
+        Return up to `limit` entries as tuples of id, filename, encrypted
+        filename, key filename and time, oldest first, optionally only
+        those with a name starting with `prefix`, see `count`
+
+        A page is found either by skipping the first `offset` entries or,
+        without reading the entries before it, as the entries following the
+        one with the id `after`.
+
+        :param limit: Number of entries
+        :type limit: int
+        :param offset: Number of entries skipped, if `after` is None
+        :type offset: int
+        :param after: Id of the entry preceding the page
+        :type after: int
+        :param prefix: Base name prefix
+        :type prefix: str
+        :return: List of entries with their ids
+        :rtype: list
+        """
+        condition, params = self._search(prefix)
+        if after is not None:
+            condition += " AND id > ?"
+            params += (after,)
+            offset = 0
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id, file, enc, key, time FROM entries "
+                f"WHERE {condition} ORDER BY id LIMIT ? OFFSET ?",
+                params + (limit, offset)
+            ).fetchall()
+        db.close()
+        return rows
+
+    def _signature(self):
+        """
+        Return the inode of the database and the file change counter in its
+        header, which SQLite increments on every commit that changes it
+
+        :return: Signature of the database, or None if it does not exist
+        :rtype: tuple
+        """
+        try:
+            with open(self.db_file, "rb") as f:
+                f.seek(24)
+                return fstat(f.fileno()).st_ino, f.read(4)
+        except FileNotFoundError:
+            return None
+
+    def index(self):
+        """
+        Return the process-wide dictionary of the base names of encrypted
+        files and their entries, reading it from the database only if it
+        changed since it was last read
+
+        A base name maps to its entry, or to a list of entries oldest first
+        if several have it. The dictionary is shared, so callers must not
+        modify it.
+
+        :return: Dictionary of base names and log entries
+        :rtype: dict
+        """
+        with _index_lock:
+            cached = _indexes.get(self.db_file)
+            if cached is not None and cached[0] == self._signature():
+                return cached[1]
+            db = self._connect()
+            # Writers cannot commit while the read transaction is open, so
+            # the signature taken inside it matches the rows read
+            db.execute("BEGIN")
+            rows = db.execute(
+                "SELECT enc_name, file, enc, key, time FROM entries "
+                f"WHERE {LIVE} ORDER BY id"
+            ).fetchall()
+            signature = self._signature()
+            db.commit()
+            db.close()
+            index = {}
+            for row in rows:
+                _add(index, row[0], row[1:])
+            _indexes[self.db_file] = [signature, index]
+            return index
+
+    def _lookup_index(self):
+        """
+        Return the index if it is up to date, reading it once enough
+        lookups were made without it, see `INDEX_LOOKUPS`
+
+        :return: Index, see `index`, or None to query the database
+        :rtype: dict
+        """
+        with _index_lock:
+            cached = _indexes.get(self.db_file)
+            if cached is not None and cached[0] == self._signature():
+                return cached[1]
+            lookups = _lookups.get(self.db_file, 0) + 1
+            _lookups[self.db_file] = 0 if lookups >= INDEX_LOOKUPS else lookups
+        return self.index() if lookups >= INDEX_LOOKUPS else None
+
+    def _current_index(self):
+        """
+        Return the cached index and its signature if it is up to date, to
+        be called inside a write transaction so that no other process can
+        change the database before the caller's own changes are applied
+
+        :return: Cached index and signature, or None
+        :rtype: list
+        """
+        with _index_lock:
+            cached = _indexes.get(self.db_file)
+            if cached is not None and cached[0] == self._signature():
+                return cached
+        return None
+
+    def _update_index(self, cached, changed, change):
+        """
+        Apply the committed changes of this process to the index returned
+        by `_current_index`, or drop the index if another process has
+        committed since
+
+        :param cached: Cached index and signature, or None
+        :type cached: list
+        :param changed: Whether the commit changed the database
+        :type changed: bool
+        :param change: Function changing the index in place
+        :type change: Callable
+        """
+        if cached is None:
+            return
+        ino, counter = cached[0]
+        if changed:
+            counter = (int.from_bytes(counter, "big") + 1).to_bytes(4, "big")
+        with _index_lock:
+            if _indexes.get(self.db_file) is not cached:
+                return
+            if self._signature() == (ino, counter):
+                change(cached[1])
+                cached[0] = ino, counter
+            else:
+                del _indexes[self.db_file]
+
+    def find(self, name, column="enc"):
+        """
+        Return the newest entry whose `column` is the file `name`, see
+        `_matching`
+
+        :param name: Filename
+        :type name: str
+        :param column: One of "file", "enc" or "key"
+        :type column: str
+        :return: Log entry, or None if there is none
+        :rtype: tuple
+        """
+        return self.find_all([name], column).get(name)
+
+    def find_all(self, names, column="enc"):
+        """
+        Look up the newest entry of each of `names` over one connection,
+        see `find`
+
+        :param names: Filenames
+        :type names: list
+        :param column: One of "file", "enc" or "key"
+        :type column: str
+        :return: Dictionary of the names that have entries and their newest
+            entries
+        :rtype: dict
+        """
+        if column not in COLUMNS:
+            raise ValueError(f"Cannot look up entries by {column}")
+        position = COLUMNS.index(column)
+        found = {}
+        index = self._lookup_index() if column == "enc" else None
+        if index is not None:
+            for name in names:
+                entry = _newest(_entries(index, bn(name)), name, position)
+                if entry is not None:
+                    found[name] = entry
+            return found
+        query = (
+            "SELECT file, enc, key, time FROM entries "
+            f"WHERE {column}_name = ? AND {LIVE} ORDER BY id"
+        )
+        with self._connect() as db:
+            for name in names:
+                entries = db.execute(query, (bn(name),)).fetchall()
+                entry = _newest(entries, name, position)
+                if entry is not None:
+                    found[name] = entry
+        db.close()
+        return found
+
+    def append(self, entries):
+        """
+        Add tuples of filename, encrypted filename and key filename
+        `entries` in a single transaction, making the paths absolute
+
+        :param entries: Log entries
+        :type entries: list
+        """
+        now = ctime(time())
+        entries = [
+            (abspath(f), abspath(e), abspath(k)) for f, e, k in entries
+        ]
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            cached = self._current_index()
+            db.executemany(
+                "INSERT INTO entries VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)",
+                [self._row(f, e, k, now) for f, e, k in entries]
+            )
+        db.close()
+
+        def change(i):
+            for f, e, k in entries:
+                _add(i, bn(e), (f, e, k, now))
+
+        self._update_index(cached, bool(entries), change)
+
+    def remove(self, filenames):
+        """
+        Remove the entries of the encrypted files `filenames` by recording
+        tombstones for them in a single transaction, then compacting the
+        store once there are enough
+
+        Only the entries of the file itself are removed, see `_matching`.
+
+        :param filenames: Encrypted filenames
+        :type filenames: list
+        """
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            cached = self._current_index()
+            before = db.total_changes
+            ids = []
+            for f in filenames:
+                rows = db.execute(
+                    "SELECT id, enc FROM entries "
+                    f"WHERE enc_name = ? AND {LIVE} ORDER BY id",
+                    (bn(f),)
+                ).fetchall()
+                ids += [rows[j][0] for j in _matching(rows, f, 1)]
+            db.executemany(
+                "INSERT OR IGNORE INTO tombstones VALUES (?)",
+                [(i,) for i in ids]
+            )
+            # Counting stops at the threshold, so this stays cheap
+            tombstones = db.execute(
+                "SELECT count(*) FROM (SELECT 1 FROM tombstones LIMIT ?)",
+                (COMPACT_THRESHOLD,)
+            ).fetchone()[0]
+            changed = db.total_changes > before
+        db.close()
+
+        def change(i):
+            for f in filenames:
+                entries = _entries(i, bn(f))
+                removed = set(_matching(entries, f, 1))
+                kept = [e for j, e in enumerate(entries) if j not in removed]
+                i.pop(bn(f), None)
+                for e in kept:
+                    _add(i, bn(f), e)
+
+        self._update_index(cached, changed, change)
+        if tombstones >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self):
+        """
+        Delete the removed entries and their tombstones
+        """
+        with _compacting:
+            self._compact()
+
+    def _compact(self):
+        """
+        Delete the removed entries and their tombstones in one transaction
+        """
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            cached = self._current_index()
+            before = db.total_changes
+            db.execute(
+                "DELETE FROM entries WHERE id IN (SELECT id FROM tombstones)"
+            )
+            db.execute("DELETE FROM tombstones")
+            changed = db.total_changes > before
+        db.close()
+        # Only removed entries are deleted, so the index stays the same
+        self._update_index(cached, changed, lambda i: None)
+
+
+def _matching(entries, name, position):
+    """
+    Return the positions in `entries` of the entries whose filename at
+    `position` is the file `name`
+
+    Paths are compared whole, after making both absolute. A file is never
+    matched by its base name alone, since another file of the same name
+    has another key.
+
+    :param entries: Rows sharing the base name of `name`
+    :type entries: list
+    :param name: Filename
+    :type name: str
+    :param position: Position of the filename in each row
+    :type position: int
+    :return: List of positions
+    :rtype: list
+    """
+    target = abspath(name)
+    return [
+        j for j, entry in enumerate(entries)
+        if abspath(entry[position]) == target
+    ]
+
+
+def _newest(entries, name, position):
+    """
+    Return the newest of `entries` that is the file `name`, see `_matching`
+
+    :param entries: Log entries sharing the base name of `name`, oldest
+        first
+    :type entries: list
+    :param name: Filename
+    :type name: str
+    :param position: Position of the filename in each entry
+    :type position: int
+    :return: Log entry, or None if none is the file `name`
+    :rtype: tuple
+    """
+    found = _matching(entries, name, position)
+    return entries[found[-1]] if found else None
+
+
+def _entries(index, name):
+    """
+    Return the entries of the base name `name` in `index`, oldest first
+
+    :param index: Index, see `LogStore.index`
+    :type index: dict
+    :param name: Base name
+    :type name: str
+    :return: List of log entries
+    :rtype: list
+    """
+    entries = index.get(name)
+    if entries is None:
+        return []
+    if isinstance(entries, list):
+        return entries
+    return [entries]
+
+
+def _add(index, name, entry):
+    """
+    Add `entry` under the base name `name` to `index`, see `LogStore.index`
+
+    :param index: Index
+    :type index: dict
+    :param name: Base name
+    :type name: str
+    :param entry: Log entry
+    :type entry: tuple
+    """
+    entries = index.get(name)
+    if entries is None:
+        index[name] = entry
+    elif isinstance(entries, list):
+        entries.append(entry)
+    else:
+        index[name] = [entries, entry]
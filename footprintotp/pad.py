@@ -0,0 +1,195 @@
+from os import replace
+from os.path import join, exists, getsize, realpath
+
+# Number of bytes at the start of a pad that identify it
+PAD_ID_BYTES = 4096
+
+
+def key_ref(pad_file, offset):
+    """
+    Given a pad filename and an offset, return a reference to the pad
+    segment starting at that offset
+
+    :param pad_file: Pad filename
+    :type pad_file: str
+    :param offset: Offset of the segment
+    :type offset: int
+    :return: Pad segment reference
+    :rtype: str
+    """
+    return f"{pad_file}@{offset}"
+
+
+def parse_key_ref(key_file):
+    """
+    Given a key filename or pad segment reference `key_file`, return the
+    filename and the offset of the segment, or None for a plain key file
+
+    A name is only read as a reference if it does not exist and the pad it
+    refers to does, so that a missing key file whose name contains "@" is
+    reported as missing.
+
+    :param key_file: Key filename or pad segment reference
+    :type key_file: str
+    :return: Tuple of filename and offset
+    :rtype: tuple
+    """
+    filename, sep, offset = key_file.rpartition("@")
+    if sep and offset.isdigit() and not exists(key_file) \
+            and exists(filename):
+        return filename, int(offset)
+    return key_file, None
+
+
+class Pad:
+    """
+    Large pad file handed out in segments, so that many messages can share
+    one file instead of each needing its own key file
+
+    Pad bytes must never be used twice, so segments are allocated from the
+    start of the pad upwards and only the end of the used region is stored.
+    It is kept in an SQLite database, `pads.db` in `state_dir`, keyed by a
+    digest of the first `PAD_ID_BYTES` of the pad, so that moving, renaming
+    or copying a pad keeps its used region, and every allocation is a write
+    transaction so that processes sharing a pad never get the same bytes.
+    State that older versions keyed by the pad's real path is still taken
+    into account. A `pads.json` left by older versions is imported the
+    first time the state is opened, then renamed to `pads.json.old`.
+
+    :param pad_file: Pad filename
+    :type pad_file: str
+    :param state_dir: Directory of the allocation state
+    :type state_dir: str
+    """
+    def __init__(self, pad_file, state_dir=""):
+        """
+        Constructor
+        """
+        self.pad_file = realpath(pad_file)
+        self.state_dir = state_dir
+        self.db_file = join(state_dir, "pads.db")
+
+    def _connect(self):
+        """
+        Open the allocation state, creating and migrating it if needed
+
+        :return: Database connection
+        :rtype: sqlite3.Connection
+        """
+        from sqlite3 import connect
+        db = connect(self.db_file, timeout=30)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS pads "
+            "(pad TEXT PRIMARY KEY, used INTEGER NOT NULL)"
+        )
+        if exists(join(self.state_dir, "pads.json")):
+            self._migrate(db)
+        return db
+
+    def _migrate(self, db):
+        """
+        Import the allocation state of `pads.json` into `db` and rename it
+
+        :param db: Database connection
+        :type db: sqlite3.Connection
+        """
+        from json import loads
+        state_file = join(self.state_dir, "pads.json")
+        with db:
+            # Take the write lock first so only one process imports it
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                with open(state_file, "r") as s:
+                    state = loads(s.read())
+            except FileNotFoundError:
+                return
+            # Never move a pad's used region backwards
+            db.executemany(
+                "INSERT INTO pads VALUES (?, ?) ON CONFLICT (pad) "
+                "DO UPDATE SET used = max(used, excluded.used)",
+                state.items()
+            )
+            replace(state_file, f"{state_file}.old")
+
+    def pad_id(self):
+        """
+        Return the identity of the pad, which depends only on its contents
+
+        :return: Digest of the first bytes of the pad
+        :rtype: str
+        """
+        from hashlib import sha256
+        with open(self.pad_file, "rb") as f:
+            return f"sha256:{sha256(f.read(PAD_ID_BYTES)).hexdigest()}"
+
+    def _used(self, db, pad_id):
+        """
+        Return the number of bytes of the pad allocated according to `db`
+
+        :param db: Database connection
+        :type db: sqlite3.Connection
+        :param pad_id: Identity of the pad, see `pad_id`
+        :type pad_id: str
+        :return: Number of bytes allocated
+        :rtype: int
+        """
+        # Older versions keyed the state by the real path of the pad
+        row = db.execute(
+            "SELECT max(used) FROM pads WHERE pad IN (?, ?)",
+            (pad_id, self.pad_file)
+        ).fetchone()
+        return row[0] or 0
+
+    def used(self):
+        """
+        Return the number of bytes of the pad already allocated
+
+        :return: Number of bytes allocated
+        :rtype: int
+        """
+        pad_id = self.pad_id()
+        with self._connect() as db:
+            used = self._used(db, pad_id)
+        db.close()
+        return used
+
+    def remaining(self):
+        """
+        Return the number of bytes of the pad still free
+
+        :return: Number of bytes free
+        :rtype: int
+        """
+        return getsize(self.pad_file) - self.used()
+
+    def allocate(self, length):
+        """
+        Reserve the next `length` unused bytes of the pad and return the
+        offset of the segment
+
+        The read and update of the used region happen in one write
+        transaction, which other threads and processes wait for.
+
+        :param length: Number of bytes
+        :type length: int
+        :return: Offset of the segment
+        :rtype: int
+        :raises ValueError: If the pad does not have `length` unused bytes
+        """
+        pad_id = self.pad_id()
+        db = self._connect()
+        try:
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                offset = self._used(db, pad_id)
+                if offset + length > getsize(self.pad_file):
+                    raise ValueError(
+                        f"Not enough unused bytes in {self.pad_file}"
+                    )
+                db.execute(
+                    "INSERT OR REPLACE INTO pads VALUES (?, ?)",
+                    (pad_id, offset + length)
+                )
+        finally:
+            db.close()
+        return offset
@@ -1,10 +1,10 @@
 from os.path import join, exists, expanduser
 from platform import system
-from json import loads, dumps
 from gi import require_versions
 require_versions({"Gtk": "4.0", "Adw": "1"})
-from gi.repository import Gtk, Gio, Adw
+from gi.repository import Gtk, Gio
 from . import *
+from .config import settings
 
 
 class Preferences(Gtk.Window):
@@ -50,10 +50,8 @@ class Preferences(Gtk.Window):
             column_spacing=spacing
         )
 
-        # Open stored preferences
-        self.config = loads(
-            open(join(CONF, "settings.json"), "r").read()
-        )
+        # Stored preferences
+        self.config = settings
 
         # Default directory label, button, and entry box
         dflt_label = Gtk.Label(halign=Gtk.Align.START)
@@ -92,7 +90,11 @@ class Preferences(Gtk.Window):
         self.appr.set_active(self.config["appr"])
 
         # Debug mode check box
-        self.dbug = Gtk.CheckButton(label="Debug Mode")
+        self.dbug = Gtk.CheckButton(
+            label="Debug Mode",
+            tooltip_text="Show errors in full and profile every encryption "
+            "and decryption"
+        )
         self.dbug.set_active(self.config["dbug"])
 
         # Default settings button
@@ -250,27 +252,15 @@ class Preferences(Gtk.Window):
             raise FileNotFoundError
         if not exists(self.save.get_text()) and self.save.get_text() != "":
             raise FileNotFoundError
-        with open(join(CONF, "settings.json"), "w") as c:
-            config = {
-                "dflt": self.dflt.get_text(),
-                "keys": self.keys.get_text(),
-                "save": self.save.get_text(),
-                "encf": self.encf.get_active(),
-                "appr": self.appr.get_active(),
-                "dbug": self.dbug.get_active()
-            }
-            c.write(dumps(config))
-            c.close()
-        # Set color scheme
-        application = self.get_transient_for().get_application()
-        if self.appr.get_active():
-            application.get_style_manager().set_color_scheme(
-                Adw.ColorScheme.FORCE_DARK
-            )
-        else:
-            application.get_style_manager().set_color_scheme(
-                Adw.ColorScheme.FORCE_LIGHT
-            )
+        # Subscribers apply the new settings, such as the color scheme
+        self.config.save({
+            "dflt": self.dflt.get_text(),
+            "keys": self.keys.get_text(),
+            "save": self.save.get_text(),
+            "encf": self.encf.get_active(),
+            "appr": self.appr.get_active(),
+            "dbug": self.dbug.get_active()
+        })
         self.destroy()
 
     def on_save_clicked(self, button):
@@ -280,8 +270,7 @@ class Preferences(Gtk.Window):
         :param button: Button
         :type button: Gtk.Button
         """
-        config = loads(open(join(CONF, "settings.json"), "r").read())
-        if not config["dbug"]:
+        if not self.config["dbug"]:
             dialog = Gtk.MessageDialog(
                 transient_for=self,
                 modal=True,
@@ -0,0 +1,143 @@
+from os import remove
+from platform import system
+from gi import require_versions
+require_versions({"Gtk": "4.0", "Adw": "1"})
+from gi.repository import Gtk, Pango
+from . import *
+from .profiling import reports
+
+
+class Profiles(Gtk.Window):
+    """
+    Window showing the profiling reports written in debug mode
+
+    :param parent: Parent window
+    :type parent: Gtk.Window
+    """
+    def __init__(self, parent):
+        """
+        Constructor
+        """
+        super().__init__(
+            modal=True,
+            transient_for=parent,
+            resizable=True,
+            title="Profiles"
+        )
+
+        # Set up header
+        header = Gtk.HeaderBar()
+
+        # Set decoration layout
+        if system() == "Darwin":
+            header.set_decoration_layout("close,minimize,maximize:")
+        else:
+            header.set_decoration_layout(":minimize,maximize,close")
+
+        # Add header
+        self.set_titlebar(header)
+
+        # Set up grid
+        spacing = 20
+        grid = Gtk.Grid(
+            column_homogeneous=True,
+            margin_start=spacing,
+            margin_end=spacing,
+            margin_top=spacing,
+            margin_bottom=spacing,
+            row_spacing=spacing,
+            column_spacing=spacing
+        )
+
+        # Report chooser, newest first
+        self.reports = []
+        self.names = Gtk.StringList()
+        self.chooser = Gtk.DropDown(model=self.names)
+        self.chooser.connect("notify::selected", self.on_report_selected)
+
+        # Scrolled report text
+        self.text = Gtk.TextView(
+            editable=False,
+            cursor_visible=False,
+            monospace=True,
+            wrap_mode=Pango.WrapMode.NONE
+        )
+        scroll = Gtk.ScrolledWindow(vexpand=True)
+        scroll.set_size_request(width=800, height=400)
+        scroll.set_child(self.text)
+
+        # Delete and close buttons
+        delete_button = Gtk.Button(label="Delete Report")
+        delete_button.connect("clicked", self.on_delete_clicked)
+        close_button = Gtk.Button(label="Close")
+        close_button.connect("clicked", self.on_close_clicked)
+
+        # Attach widgets to grid
+        widgets = [
+            [self.chooser],
+            [scroll],
+            [delete_button, close_button]
+        ]
+        for i in range(len(widgets)):
+            width = max(len(row) for row in widgets) // len(widgets[i])
+            for j in range(len(widgets[i])):
+                grid.attach(widgets[i][j], j * width, i, width, 1)
+
+        # Add grid
+        self.set_child(grid)
+
+        self._load_reports()
+
+    def _load_reports(self):
+        """
+        List the reports in the chooser and show the newest one
+        """
+        self.reports = reports()
+        self.names.splice(
+            0, self.names.get_n_items(), [bn(r) for r in self.reports]
+        )
+        if self.reports:
+            self.chooser.set_selected(0)
+        self.on_report_selected(self.chooser, None)
+
+    def on_report_selected(self, chooser, pspec):
+        """
+        Show the selected report
+
+        :param chooser: Report chooser
+        :type chooser: Gtk.DropDown
+        :param pspec: Property specification
+        :type pspec: GObject.ParamSpec
+        """
+        i = chooser.get_selected()
+        if i >= len(self.reports):
+            text = "No profiles yet. Turn on Debug Mode in the preferences " \
+                "to profile every encryption and decryption."
+        else:
+            try:
+                with open(self.reports[i], "r") as r:
+                    text = r.read()
+            except OSError as e:
+                text = str(e)
+        self.text.get_buffer().set_text(text)
+
+    def on_delete_clicked(self, button):
+        """
+        Delete the selected report
+
+        :param button: Delete button
+        :type button: Gtk.Button
+        """
+        i = self.chooser.get_selected()
+        if i < len(self.reports):
+            remove(self.reports[i])
+            self._load_reports()
+
+    def on_close_clicked(self, button):
+        """
+        Close the window
+
+        :param button: Close button
+        :type button: Gtk.Button
+        """
+        self.destroy()
@@ -0,0 +1,233 @@
+from os import makedirs, listdir
+from os.path import join, getmtime
+from platform import platform, python_version
+from threading import Lock
+from time import localtime, strftime
+from . import __version__
+from . import *
+
+# Number of functions listed in a report, by cumulative time
+TOP_FUNCTIONS = 40
+# Number of allocation sites listed in a report, by size
+TOP_ALLOCATIONS = 20
+# Extension of report filenames
+EXT = ".prof.txt"
+
+# Number of profiled calls running, and whether they started tracemalloc,
+# so that only the last one to finish stops it
+_tracing = {"calls": 0, "started": False}
+_tracing_lock = Lock()
+
+
+def profiles_dir():
+    """
+    Return the directory that profiling reports are written to
+
+    :return: Reports directory
+    :rtype: str
+    """
+    return join(DATA, "profiles")
+
+
+def profiled(func, name):
+    """
+    Wrap `func` so that every call is profiled and a report is written to
+    `profiles_dir`, also when the call raises
+
+    The report holds the arguments and outcome of the call, the per-phase
+    timings of the `stats` keyword argument if there is one (see
+    `stats.Stats`), the peak memory allocated while it ran along with the
+    largest allocation sites, and the functions that took the most time.
+
+    `cProfile` only sees the thread the call runs in, so neither the worker
+    processes of the "parallel" backend nor the thread pool jobs of
+    `StreamCipher.encrypt_tree` and `StreamCipher.decrypt_tree` are
+    profiled, and `tracemalloc` slows every allocation down while it
+    traces. Calls may overlap, in which case tracing stops when the last
+    one finishes and the peak of each covers the calls running alongside
+    it. A report that cannot be collected or written is skipped rather
+    than failing the call.
+
+    :param func: Function to profile
+    :type func: Callable
+    :param name: Operation name, used in the report filename
+    :type name: str
+    :return: Profiled function
+    :rtype: Callable
+    """
+    def wrapper(*args, **kwargs):
+        from cProfile import Profile
+        from time import perf_counter
+        _start_tracing()
+        profile = Profile()
+        started = localtime()
+        start = perf_counter()
+        outcome = None
+        try:
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active, which newer Pythons refuse
+                profile = None
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+            outcome = f"Returned {result!r}"
+            return result
+        except BaseException as e:
+            outcome = f"Raised {type(e).__name__}: {e}"
+            raise
+        finally:
+            seconds = perf_counter() - start
+            # A report that cannot be written must not replace the outcome
+            # of the call, which may already have deleted its inputs
+            try:
+                _, peak, snapshot = _stop_tracing()
+                _write_report(
+                    name,
+                    started,
+                    args,
+                    kwargs,
+                    outcome,
+                    seconds,
+                    peak,
+                    snapshot,
+                    profile
+                )
+            except Exception:
+                pass
+
+    return wrapper
+
+
+def _start_tracing():
+    """
+    Start tracing allocations unless a profiled call or the user already
+    is, and reset the peak
+    """
+    import tracemalloc
+    with _tracing_lock:
+        if _tracing["calls"] == 0:
+            _tracing["started"] = not tracemalloc.is_tracing()
+            if _tracing["started"]:
+                tracemalloc.start()
+        _tracing["calls"] += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing():
+    """
+    Return the traced memory and a snapshot of the allocations, then stop
+    tracing if this is the last profiled call running and tracing was
+    started by one
+
+    :return: Tuple of current and peak bytes allocated and snapshot
+    :rtype: tuple
+    """
+    import tracemalloc
+    with _tracing_lock:
+        try:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            _tracing["calls"] -= 1
+            if _tracing["calls"] == 0 and _tracing["started"]:
+                tracemalloc.stop()
+        return current, peak, snapshot
+
+
+def _write_report(
+    name,
+    started,
+    args,
+    kwargs,
+    outcome,
+    seconds,
+    peak,
+    snapshot,
+    profile
+):
+    """
+    Write the report of a profiled call to a new timestamped file in
+    `profiles_dir`
+
+    :param name: Operation name
+    :type name: str
+    :param started: Local time the call started at
+    :type started: time.struct_time
+    :param args: Positional arguments of the call
+    :type args: tuple
+    :param kwargs: Keyword arguments of the call
+    :type kwargs: dict
+    :param outcome: Return value or exception of the call
+    :type outcome: str
+    :param seconds: Number of seconds the call took
+    :type seconds: float
+    :param peak: Peak number of bytes allocated during the call
+    :type peak: int
+    :param snapshot: Allocations at the end of the call
+    :type snapshot: tracemalloc.Snapshot
+    :param profile: Profile of the call, or None if it was not profiled
+    :type profile: cProfile.Profile
+    :return: Report filename
+    :rtype: str
+    """
+    from io import StringIO
+    from pstats import Stats as ProfileStats
+    options = {k: v for k, v in kwargs.items() if k != "stats"}
+    lines = [
+        f"Operation\t{name}",
+        f"Version\t{APPNAME} {__version__}",
+        f"Python\t{python_version()} on {platform()}",
+        f"Started\t{strftime('%Y-%m-%d %H:%M:%S', started)}",
+        f"Arguments\t{args!r}",
+        f"Options\t{options!r}",
+        f"Outcome\t{outcome}",
+        f"Time\t{seconds * 1000:.3f} ms",
+        ""
+    ]
+    stats = kwargs.get("stats")
+    if stats is not None:
+        lines += ["Phases", stats.report(), ""]
+    lines.append(f"Peak allocation\t{peak} bytes")
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+        lines.append(f"  {stat}")
+    lines.append("")
+    if profile is not None:
+        stream = StringIO()
+        ProfileStats(profile, stream=stream) \
+            .sort_stats("cumulative") \
+            .print_stats(TOP_FUNCTIONS)
+        lines.append(stream.getvalue())
+    else:
+        lines.append("Functions not profiled, another profiler was active")
+    makedirs(profiles_dir(), exist_ok=True)
+    stamp = strftime("%Y%m%d-%H%M%S", started)
+    report = join(profiles_dir(), f"{stamp}-{name}{EXT}")
+    # Calls starting within the same second get numbered reports
+    i = 1
+    while True:
+        try:
+            with open(report, "x") as r:
+                r.write("\n".join(lines))
+            return report
+        except FileExistsError:
+            i += 1
+            report = join(profiles_dir(), f"{stamp}-{name}-{i}{EXT}")
+
+
+def reports():
+    """
+    Return the filenames of the profiling reports, newest first
+
+    :return: List of report filenames
+    :rtype: list
+    """
+    try:
+        names = [n for n in listdir(profiles_dir()) if n.endswith(EXT)]
+    except FileNotFoundError:
+        return []
+    filenames = [join(profiles_dir(), n) for n in names]
+    return sorted(filenames, key=getmtime, reverse=True)
@@ -0,0 +1,153 @@
+from threading import Event, Thread
+from time import perf_counter, strftime, gmtime
+from gi import require_versions
+require_versions({"Gtk": "4.0", "Adw": "1"})
+from gi.repository import Gtk, GLib
+
+# Minimum number of seconds between progress bar updates
+UPDATE_INTERVAL = 0.1
+
+
+class Progress(Gtk.Box):
+    """
+    Progress bar and Cancel button of a job running on a worker thread
+
+    The job is a function taking `progress` and `cancel` keyword arguments,
+    such as `StreamCipher.encrypt_file`. Its progress is handed to the main
+    loop through `GLib.idle_add`, so the window stays responsive.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        super().__init__(spacing=20)
+
+        self.bar = Gtk.ProgressBar(
+            show_text=True,
+            hexpand=True,
+            valign=Gtk.Align.CENTER
+        )
+        self.bar.set_text("")
+        self.cancel_button = Gtk.Button(label="Cancel", sensitive=False)
+        self.cancel_button.connect("clicked", self.on_cancel_clicked)
+        self.append(self.bar)
+        self.append(self.cancel_button)
+
+        self._cancel = None
+        self._start = 0
+        self._last = 0
+
+    def running(self):
+        """
+        Return whether a job is running
+
+        :return: Whether a job is running
+        :rtype: bool
+        """
+        return self._cancel is not None
+
+    def start(self, func, args, kwargs, on_done, on_error):
+        """
+        Run `func` with arguments `args` and `kwargs` on a worker thread,
+        then call `on_done` with its return value or `on_error` with the
+        exception it raised on the main loop
+
+        :param func: Job function
+        :type func: Callable
+        :param args: Positional arguments
+        :type args: tuple
+        :param kwargs: Keyword arguments
+        :type kwargs: dict
+        :param on_done: Function taking the return value
+        :type on_done: Callable
+        :param on_error: Function taking the exception
+        :type on_error: Callable
+        """
+        cancel = Event()
+        self._cancel = cancel
+        self._start = perf_counter()
+        self._last = 0
+        self.bar.set_fraction(0)
+        self.bar.set_text("Starting")
+        self.cancel_button.set_sensitive(True)
+
+        def progress(done, total):
+            now = perf_counter()
+            if now - self._last >= UPDATE_INTERVAL or done == total:
+                self._last = now
+                GLib.idle_add(
+                    self._update, cancel, done, total, now - self._start
+                )
+
+        def run():
+            try:
+                result = func(
+                    *args, **kwargs, progress=progress, cancel=cancel
+                )
+            except Exception as e:
+                GLib.idle_add(self._finish, cancel, on_error, e)
+            else:
+                GLib.idle_add(self._finish, cancel, on_done, result)
+
+        Thread(target=run, daemon=True).start()
+
+    def _update(self, cancel, done, total, elapsed):
+        """
+        Show the bytes done, throughput and remaining time of the job
+
+        :param cancel: Cancel event of the job
+        :type cancel: threading.Event
+        :param done: Number of bytes done
+        :type done: int
+        :param total: Total number of bytes
+        :type total: int
+        :param elapsed: Number of seconds since the job started
+        :type elapsed: float
+        :return: False to run only once
+        :rtype: bool
+        """
+        # Updates may arrive after the job has finished or been cancelled
+        if cancel is not self._cancel or cancel.is_set():
+            return False
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else 0
+        self.bar.set_fraction(done / total if total else 1)
+        self.bar.set_text(
+            f"{done / 1e6:.1f} of {total / 1e6:.1f} MB, "
+            f"{rate / 1e6:.1f} MB/s, "
+            f"{strftime('%H:%M:%S', gmtime(eta))} left"
+        )
+        return False
+
+    def _finish(self, cancel, callback, value):
+        """
+        Reset the progress bar and hand the outcome of the job to `callback`
+
+        :param cancel: Cancel event of the job
+        :type cancel: threading.Event
+        :param callback: `on_done` or `on_error`
+        :type callback: Callable
+        :param value: Return value or exception
+        :type value: Any
+        :return: False to run only once
+        :rtype: bool
+        """
+        if cancel is self._cancel:
+            self._cancel = None
+            self.bar.set_fraction(0)
+            self.bar.set_text("")
+            self.cancel_button.set_sensitive(False)
+        callback(value)
+        return False
+
+    def on_cancel_clicked(self, button):
+        """
+        Stop the running job after the chunk in progress
+
+        :param button: Cancel button
+        :type button: Gtk.Button
+        """
+        if self._cancel is not None:
+            self._cancel.set()
+            self.bar.set_text("Cancelling")
+            button.set_sensitive(False)
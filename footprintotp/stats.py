@@ -0,0 +1,85 @@
+from time import perf_counter
+
+# Phases of an operation, in the order they run
+PHASES = ("read", "xor", "write", "key", "sync", "log")
+
+
+class Stats:
+    """
+    Bytes processed by an encryption or decryption and the seconds spent
+    in each of its phases, measured with `time.perf_counter`
+
+    The "mmap" backend reads and writes through page faults during the XOR,
+    so its I/O is counted as XOR time. The "parallel" backend sums the
+    phases over its worker processes, so they can add up to more than the
+    elapsed time.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.bytes = 0
+        self.seconds = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self._start = perf_counter()
+
+    def start(self):
+        """
+        Start timing the operation
+        """
+        self._start = perf_counter()
+
+    def stop(self):
+        """
+        Stop timing the operation
+        """
+        self.seconds = perf_counter() - self._start
+
+    def add(self, phase, seconds):
+        """
+        Add `seconds` to the time spent in `phase`
+
+        :param phase: One of `PHASES`
+        :type phase: str
+        :param seconds: Number of seconds
+        :type seconds: float
+        """
+        self.phases[phase] += seconds
+
+    def mb_per_s(self):
+        """
+        Return the throughput of the operation
+
+        :return: Megabytes per second
+        :rtype: float
+        """
+        return self.bytes / self.seconds / 1e6 if self.seconds else 0.0
+
+    def as_dict(self):
+        """
+        Return the statistics as a dictionary
+
+        :return: Dictionary of bytes, seconds, MB/s and phase seconds
+        :rtype: dict
+        """
+        return {
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "mb_per_s": self.mb_per_s(),
+            **{f"{phase}_seconds": s for phase, s in self.phases.items()}
+        }
+
+    def report(self):
+        """
+        Return the statistics as lines of text, with times in milliseconds
+
+        :return: Report
+        :rtype: str
+        """
+        lines = [
+            f"{self.bytes} bytes in {self.seconds * 1000:.3f} ms, "
+            f"{self.mb_per_s():.1f} MB/s"
+        ]
+        for phase, seconds in self.phases.items():
+            lines.append(f"{phase}\t{seconds * 1000:.3f} ms")
+        return "\n".join(lines)
@@ -1,9 +1,51 @@
-from base64 import urlsafe_b64encode, urlsafe_b64decode
-from os import remove
-from os.path import splitext, exists, join
-from time import time, ctime
-from binascii import Error as BinasciiError
-from . import *
+from mmap import mmap, ACCESS_READ, ACCESS_WRITE, ALLOCATIONGRANULARITY
+from errno import EXDEV
+from os import remove, replace, cpu_count, open as os_open, close, walk
+from os import makedirs, scandir, O_RDONLY, O_WRONLY, O_CREAT, O_EXCL
+from os.path import splitext, exists, join, samefile, getsize, relpath
+from os.path import normpath, dirname
+from threading import Lock
+from time import perf_counter
+from . import bn
+from .durable import SyncGroup, SYNC_GROUP, temp_name, discard
+from .log_store import LogStore
+from .pad import Pad, key_ref, parse_key_ref
+from .stats import Stats
+
+# Positioned I/O is not available on Windows
+try:
+    from os import preadv, pwrite
+except ImportError:
+    preadv = pwrite = None
+
+# In-kernel file copies are only available on Linux
+try:
+    from os import copy_file_range
+except ImportError:
+    copy_file_range = None
+
+# Number of bytes XORed per machine-word block
+XOR_BLOCK = 1 << 16
+# Default number of bytes read from each file per streaming step
+CHUNK_SIZE = 1 << 22
+# File size from which the "auto" backend memory-maps the files
+MMAP_THRESHOLD = 1 << 26
+# Backends accepted by `StreamCipher.xor_file`
+BACKENDS = ("auto", "stream", "mmap", "parallel")
+# Number of output names whose next suffix is remembered
+SUFFIX_NAMES = 1024
+
+# Next `name(i).ext` suffix to try by output name without `i`, so that
+# clashing outputs do not probe every earlier copy, least recently used
+# first
+_suffixes = {}
+_suffix_lock = Lock()
+
+
+class Cancelled(Exception):
+    """
+    Raised when an operation is stopped through its `cancel` event
+    """
 
 
 class StreamCipher:
@@ -11,7 +53,13 @@ class StreamCipher:
     @staticmethod
     def xor(message, key):
         """
-        Given bytes inputs `message` and `key`, return the bitwise XOR of the two
+        Given bytes inputs `message` and `key`, return the bitwise XOR of the
+        two, truncated to the shorter of the two
+
+        Each block of `XOR_BLOCK` bytes is converted to a single integer so
+        the XOR runs on whole machine words in C rather than one byte at a
+        time in Python. The target throughput is at least 100 MB/s per core,
+        roughly ten times the previous per-byte generator.
         
         :param message: Message
         :type message: bytes
@@ -20,7 +68,693 @@ class StreamCipher:
         :return: Bitwise XOR of message and key
         :rtype: bytes
         """
-        return bytes(m ^ k for m, k in zip(message, key))
+        size = min(len(message), len(key))
+        result = bytearray(size)
+        StreamCipher._xor_into(memoryview(result), message, key, size)
+        return bytes(result)
+
+    @staticmethod
+    def _xor_into(view, message, key, size):
+        """
+        Write the bitwise XOR of the first `size` bytes of `message` and `key`
+        into the writable buffer `view`, one block of `XOR_BLOCK` bytes at a
+        time
+        
+        :param view: Output buffer
+        :type view: memoryview
+        :param message: Message
+        :type message: bytes
+        :param key: Key
+        :type key: bytes
+        :param size: Number of bytes
+        :type size: int
+        """
+        message = memoryview(message)
+        key = memoryview(key)
+        for start in range(0, size, XOR_BLOCK):
+            end = min(start + XOR_BLOCK, size)
+            view[start:end] = (
+                int.from_bytes(message[start:end], "little")
+                ^ int.from_bytes(key[start:end], "little")
+            ).to_bytes(end - start, "little")
+
+    @staticmethod
+    def _xor_stream(
+        filename,
+        key_file,
+        out_file,
+        chunk_size=CHUNK_SIZE,
+        key_offset=0,
+        stats=None
+    ):
+        """
+        Generator that XORs `filename` with `key_file` into `out_file` one
+        chunk at a time, yielding the number of bytes written so far
+
+        Each file is read with `readinto` into a buffer allocated once, the
+        XOR is written back into the message buffer and the output is
+        written from a view of it, so no new buffers are created per chunk
+        and memory use does not depend on the size of the files.
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param out_file: Output filename
+        :type out_file: str
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        :param key_offset: Offset of the first key byte in `key_file`
+        :type key_offset: int
+        :param stats: Statistics to add the phase times to
+        :type stats: stats.Stats
+        :return: Number of bytes written so far
+        :rtype: Iterator[int]
+        """
+        if stats is None:
+            stats = Stats()
+        done = 0
+        m_buf = memoryview(bytearray(chunk_size))
+        k_buf = memoryview(bytearray(chunk_size))
+        with open(filename, "rb") as m, open(key_file, "rb") as k, \
+                open(out_file, "wb") as o:
+            k.seek(key_offset)
+            while True:
+                t0 = perf_counter()
+                size = min(m.readinto(m_buf), k.readinto(k_buf))
+                t1 = perf_counter()
+                stats.add("read", t1 - t0)
+                if not size:
+                    break
+                StreamCipher._xor_into(m_buf, m_buf, k_buf, size)
+                t2 = perf_counter()
+                o.write(m_buf[:size])
+                stats.add("xor", t2 - t1)
+                stats.add("write", perf_counter() - t2)
+                done += size
+                yield done
+
+    @staticmethod
+    def _xor_mmap(
+        filename,
+        key_file,
+        out_file,
+        chunk_size=CHUNK_SIZE,
+        key_offset=0,
+        stats=None
+    ):
+        """
+        Generator that XORs `filename` with `key_file` into `out_file` by
+        memory-mapping all three files, yielding the number of bytes written
+        so far
+
+        The XOR reads from and writes to the mappings directly, leaving the
+        I/O to the page cache. Empty inputs cannot be mapped, so they are
+        handed to `_xor_stream` instead.
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param out_file: Output filename
+        :type out_file: str
+        :param chunk_size: Number of bytes XORed between yields
+        :type chunk_size: int
+        :param key_offset: Offset of the first key byte in `key_file`
+        :type key_offset: int
+        :param stats: Statistics to add the phase times to
+        :type stats: stats.Stats
+        :return: Number of bytes written so far
+        :rtype: Iterator[int]
+        """
+        if stats is None:
+            stats = Stats()
+        size = min(getsize(filename), getsize(key_file) - key_offset)
+        if size <= 0:
+            yield from StreamCipher._xor_stream(
+                filename, key_file, out_file, chunk_size, key_offset, stats
+            )
+            return
+        # Mappings must start on an allocation boundary
+        k_start = key_offset - key_offset % ALLOCATIONGRANULARITY
+        k_skip = key_offset - k_start
+        with open(filename, "rb") as m, open(key_file, "rb") as k, \
+                open(out_file, "wb+") as o:
+            o.truncate(size)
+            with mmap(m.fileno(), size, access=ACCESS_READ) as m_map, \
+                    mmap(
+                        k.fileno(),
+                        k_skip + size,
+                        access=ACCESS_READ,
+                        offset=k_start
+                    ) as k_map, \
+                    mmap(o.fileno(), size, access=ACCESS_WRITE) as o_map:
+                # Views must be released before the mappings are closed
+                with memoryview(m_map) as m_view, \
+                        memoryview(k_map) as k_view, \
+                        memoryview(o_map) as o_view:
+                    for start in range(0, size, chunk_size):
+                        end = min(start + chunk_size, size)
+                        t = perf_counter()
+                        StreamCipher._xor_into(
+                            o_view[start:end],
+                            m_view[start:end],
+                            k_view[k_skip + start:k_skip + end],
+                            end - start
+                        )
+                        stats.add("xor", perf_counter() - t)
+                        yield end
+
+    @staticmethod
+    def _read_at(fd, view, pos):
+        """
+        Fill the buffer `view` with the bytes of file descriptor `fd` starting
+        at offset `pos`
+        
+        :param fd: File descriptor
+        :type fd: int
+        :param view: Buffer to fill
+        :type view: memoryview
+        :param pos: File offset
+        :type pos: int
+        """
+        read = 0
+        while read < len(view):
+            n = preadv(fd, [view[read:]], pos + read)
+            if not n:
+                raise EOFError(f"Unexpected end of file at offset {pos + read}")
+            read += n
+
+    @staticmethod
+    def _xor_range(
+        filename,
+        key_file,
+        out_file,
+        start,
+        end,
+        chunk_size,
+        key_offset=0
+    ):
+        """
+        XOR the bytes from `start` to `end` of `filename` and `key_file` into
+        the same range of `out_file` using positioned reads and writes
+
+        This runs in a worker process of `_xor_parallel`, so it opens the
+        files itself and never touches the file offsets of other workers.
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param out_file: Output filename
+        :type out_file: str
+        :param start: First byte of the range
+        :type start: int
+        :param end: End of the range, exclusive
+        :type end: int
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        :param key_offset: Offset of the first key byte in `key_file`
+        :type key_offset: int
+        :return: Number of bytes written and seconds spent reading, XORing
+            and writing
+        :rtype: tuple
+        """
+        read = xor = write = 0.0
+        m_buf = memoryview(bytearray(chunk_size))
+        k_buf = memoryview(bytearray(chunk_size))
+        m = os_open(filename, O_RDONLY)
+        k = os_open(key_file, O_RDONLY)
+        o = os_open(out_file, O_WRONLY)
+        try:
+            for pos in range(start, end, chunk_size):
+                size = min(chunk_size, end - pos)
+                t0 = perf_counter()
+                StreamCipher._read_at(m, m_buf[:size], pos)
+                StreamCipher._read_at(k, k_buf[:size], key_offset + pos)
+                t1 = perf_counter()
+                StreamCipher._xor_into(m_buf, m_buf, k_buf, size)
+                t2 = perf_counter()
+                written = 0
+                while written < size:
+                    written += pwrite(o, m_buf[written:size], pos + written)
+                read += t1 - t0
+                xor += t2 - t1
+                write += perf_counter() - t2
+        finally:
+            close(m)
+            close(k)
+            close(o)
+        return end - start, read, xor, write
+
+    @staticmethod
+    def _xor_parallel(
+        filename,
+        key_file,
+        out_file,
+        chunk_size=CHUNK_SIZE,
+        workers=None,
+        key_offset=0,
+        stats=None
+    ):
+        """
+        Generator that XORs `filename` with `key_file` into `out_file` by
+        splitting the files into byte ranges handled by a pool of `workers`
+        processes, yielding the number of bytes written so far
+
+        The XOR holds the GIL, so processes rather than threads are used.
+        Platforms without `os.preadv` fall back to `_xor_stream`.
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param out_file: Output filename
+        :type out_file: str
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        :param workers: Number of worker processes, or None for one per core
+        :type workers: int
+        :param key_offset: Offset of the first key byte in `key_file`
+        :type key_offset: int
+        :param stats: Statistics to add the phase times to
+        :type stats: stats.Stats
+        :return: Number of bytes written so far
+        :rtype: Iterator[int]
+        """
+        if stats is None:
+            stats = Stats()
+        size = min(getsize(filename), getsize(key_file) - key_offset)
+        if preadv is None or size <= chunk_size:
+            yield from StreamCipher._xor_stream(
+                filename, key_file, out_file, chunk_size, key_offset, stats
+            )
+            return
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        workers = workers or cpu_count() or 1
+        with open(out_file, "wb") as o:
+            o.truncate(size)
+        # Give each worker several ranges so uneven disks balance out,
+        # keeping every range a whole number of chunks
+        chunks = -(-size // chunk_size)
+        step = max(1, chunks // (workers * 4)) * chunk_size
+        done = 0
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(
+                    StreamCipher._xor_range,
+                    filename,
+                    key_file,
+                    out_file,
+                    start,
+                    min(start + step, size),
+                    chunk_size,
+                    key_offset
+                )
+                for start in range(0, size, step)
+            ]
+            try:
+                for future in as_completed(futures):
+                    length, read, xor, write = future.result()
+                    stats.add("read", read)
+                    stats.add("xor", xor)
+                    stats.add("write", write)
+                    done += length
+                    yield done
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    @staticmethod
+    def _xor_steps(
+        filename,
+        key_file,
+        out_file,
+        chunk_size,
+        backend,
+        workers=1,
+        key_offset=0,
+        stats=None
+    ):
+        """
+        Return the step generator of the backend `backend`, resolving
+        "auto" by the size of `filename` and `workers`
+        
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param out_file: Output filename
+        :type out_file: str
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        :param backend: One of `BACKENDS`
+        :type backend: str
+        :param workers: Number of worker processes for "parallel"
+        :type workers: int
+        :param key_offset: Offset of the first key byte in `key_file`
+        :type key_offset: int
+        :param stats: Statistics to add the phase times to
+        :type stats: stats.Stats
+        :return: Number of bytes written so far
+        :rtype: Iterator[int]
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "auto":
+            if getsize(filename) < MMAP_THRESHOLD:
+                backend = "stream"
+            elif workers != 1:
+                backend = "parallel"
+            else:
+                backend = "mmap"
+        if backend == "parallel":
+            return StreamCipher._xor_parallel(
+                filename,
+                key_file,
+                out_file,
+                chunk_size,
+                workers,
+                key_offset,
+                stats
+            )
+        if backend == "mmap":
+            return StreamCipher._xor_mmap(
+                filename, key_file, out_file, chunk_size, key_offset, stats
+            )
+        return StreamCipher._xor_stream(
+            filename, key_file, out_file, chunk_size, key_offset, stats
+        )
+
+    @staticmethod
+    def _xor_counted(
+        filename,
+        key_file,
+        out_file,
+        chunk_size,
+        backend,
+        workers=1,
+        key_offset=0,
+        stats=None
+    ):
+        """
+        Generator that passes on the steps of `_xor_steps`, adding the bytes
+        written to `stats` at the end and returning their number
+
+        Closing it closes the backend's generator, and with it the files,
+        before the caller cleans up.
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param out_file: Output filename
+        :type out_file: str
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        :param backend: One of `BACKENDS`
+        :type backend: str
+        :param workers: Number of worker processes for "parallel"
+        :type workers: int
+        :param key_offset: Offset of the first key byte in `key_file`
+        :type key_offset: int
+        :param stats: Statistics to add the phase times to
+        :type stats: stats.Stats
+        :return: Number of bytes written so far
+        :rtype: Iterator[int]
+        """
+        done = 0
+        steps = StreamCipher._xor_steps(
+            filename,
+            key_file,
+            out_file,
+            chunk_size,
+            backend,
+            workers,
+            key_offset,
+            stats
+        )
+        try:
+            for done in steps:
+                yield done
+        finally:
+            steps.close()
+        if stats is not None:
+            stats.bytes += done
+        return done
+
+    @staticmethod
+    def xor_file(
+        filename,
+        key_file,
+        out_file,
+        chunk_size=CHUNK_SIZE,
+        backend="auto",
+        workers=1,
+        key_offset=0,
+        progress=None,
+        cancel=None,
+        stats=None
+    ):
+        """
+        Given a file and key file, write the bitwise XOR of the two to
+        `out_file` without loading either file into memory, reading the key
+        from `key_offset` onwards
+
+        The "stream" backend reads the files in chunks, the "mmap" backend
+        maps them into memory and the "parallel" backend splits them into
+        byte ranges across `workers` processes. "auto" uses "stream" below
+        `MMAP_THRESHOLD` bytes, then "parallel" if `workers` is not 1 and
+        "mmap" otherwise.
+
+        `progress` is called with the number of bytes written and the size
+        of `filename` after every chunk. Once `cancel` is set, the partial
+        output is removed and `Cancelled` is raised. The bytes written and
+        the time spent reading, XORing and writing are added to `stats`.
+        
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param out_file: Output filename
+        :type out_file: str
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        :param backend: One of `BACKENDS`
+        :type backend: str
+        :param workers: Number of worker processes, or None for one per core
+        :type workers: int
+        :param key_offset: Offset of the first key byte in `key_file`
+        :type key_offset: int
+        :param progress: Function taking bytes written and total bytes
+        :type progress: Callable
+        :param cancel: Cancel event
+        :type cancel: threading.Event
+        :param stats: Statistics
+        :type stats: stats.Stats
+        :return: Number of bytes written
+        :rtype: int
+        """
+        steps = StreamCipher._xor_counted(
+            filename,
+            key_file,
+            out_file,
+            chunk_size,
+            backend,
+            workers,
+            key_offset,
+            stats
+        )
+        try:
+            return StreamCipher._drain(
+                steps, getsize(filename), progress, cancel
+            )
+        except Cancelled:
+            remove(out_file)
+            raise
+
+    @staticmethod
+    def _drain(steps, total, progress=None, cancel=None):
+        """
+        Run the step generator `steps` to the end and return what it
+        returns
+
+        `progress` is called with the number of bytes written and `total`
+        after every step. Once `cancel` is set, `steps` is closed, which
+        makes it remove its partial output, and `Cancelled` is raised.
+
+        :param steps: Step generator, see `_encrypt_steps`
+        :type steps: Iterator[int]
+        :param total: Total number of bytes
+        :type total: int
+        :param progress: Function taking bytes written and total bytes
+        :type progress: Callable
+        :param cancel: Cancel event
+        :type cancel: threading.Event
+        :return: Return value of `steps`
+        :rtype: Any
+        """
+        done = 0
+        while True:
+            try:
+                done = next(steps)
+            except StopIteration as e:
+                return e.value
+            if cancel is not None and cancel.is_set():
+                steps.close()
+                raise Cancelled(f"Cancelled after {done} of {total} bytes")
+            if progress is not None:
+                progress(done, total)
+
+    @staticmethod
+    def _copy_range(key_file, key_filename, length, chunk_size=CHUNK_SIZE):
+        """
+        Copy the first `length` bytes of `key_file` to `key_filename`,
+        in the kernel with `os.copy_file_range` where possible and one chunk
+        at a time otherwise
+        
+        :param key_file: Key filename
+        :type key_file: str
+        :param key_filename: Destination key filename
+        :type key_filename: str
+        :param length: Number of bytes
+        :type length: int
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        """
+        with open(key_file, "rb") as src, open(key_filename, "wb") as dst:
+            done = 0
+            if copy_file_range is not None:
+                try:
+                    while done < length:
+                        n = copy_file_range(
+                            src.fileno(), dst.fileno(), length - done
+                        )
+                        if not n:
+                            break
+                        done += n
+                except OSError:
+                    # Unsupported by the kernel or file systems, carry on
+                    # from wherever the copy stopped
+                    src.seek(done)
+                    dst.seek(done)
+            buffer = memoryview(bytearray(chunk_size))
+            while done < length:
+                n = src.readinto(buffer[:min(chunk_size, length - done)])
+                if not n:
+                    break
+                dst.write(buffer[:n])
+                done += n
+
+    @staticmethod
+    def _place_key(
+        key_file,
+        key_filename,
+        length,
+        move=False,
+        chunk_size=CHUNK_SIZE,
+        group=None
+    ):
+        """
+        Put the first `length` bytes of `key_file` at `key_filename` using
+        the cheapest strategy available, and add it to the sync group
+        `group`, or make it durable right away if there is none
+
+        A key that is already in place is truncated. With `move` the key is
+        renamed, which only works on the same file system, and then
+        truncated. Otherwise only the used bytes are copied to a temporary
+        file, see `_copy_range`, and a moved key is only removed once its
+        copy is durable.
+        
+        :param key_file: Key filename
+        :type key_file: str
+        :param key_filename: Destination key filename
+        :type key_filename: str
+        :param length: Number of key bytes used
+        :type length: int
+        :param move: Move rather than copy the key
+        :type move: bool
+        :param chunk_size: Number of bytes per chunk
+        :type chunk_size: int
+        :param group: Sync group
+        :type group: durable.SyncGroup
+        """
+        own = group is None
+        if own:
+            group = SyncGroup()
+        if exists(key_filename) and samefile(key_file, key_filename):
+            StreamCipher._truncate(key_filename, length)
+            group.add(key_filename)
+            move = False
+        elif move and StreamCipher._rename_key(key_file, key_filename):
+            StreamCipher._truncate(key_filename, length)
+            group.add(key_filename)
+            move = False
+        else:
+            temp = temp_name(key_filename)
+            try:
+                StreamCipher._copy_range(key_file, temp, length, chunk_size)
+            except BaseException:
+                discard(temp)
+                raise
+            group.add(key_filename, temp)
+        if own or move:
+            group.commit()
+        if move:
+            remove(key_file)
+
+    @staticmethod
+    def _rename_key(key_file, key_filename):
+        """
+        Rename `key_file` to `key_filename` if they are on the same file
+        system
+
+        :param key_file: Key filename
+        :type key_file: str
+        :param key_filename: Destination key filename
+        :type key_filename: str
+        :return: Whether the key was renamed
+        :rtype: bool
+        """
+        try:
+            replace(key_file, key_filename)
+        except OSError as e:
+            if e.errno != EXDEV:
+                raise
+            return False
+        return True
+
+    @staticmethod
+    def _truncate(filename, length):
+        """
+        Truncate `filename` to `length` bytes if it is longer
+        
+        :param filename: Filename
+        :type filename: str
+        :param length: Number of bytes
+        :type length: int
+        """
+        if getsize(filename) > length:
+            with open(filename, "r+b") as f:
+                f.truncate(length)
+
+    @staticmethod
+    def _name_key(key, length):
+        """
+        Return the key filename `key` as at least `length` bytes, repeating
+        it if it is shorter so that no part of the filename is lost
+
+        :param key: Key filename
+        :type key: str
+        :param length: Number of bytes
+        :type length: int
+        :return: Key bytes
+        :rtype: bytes
+        """
+        key = key.encode()
+        if not key:
+            return key
+        return key * (length // len(key) + 1)
 
     @staticmethod
     def encrypt_filename(filename, key_file, enc_names=False, file_dir="", keys_dir=""):
@@ -44,8 +778,13 @@ class StreamCipher:
         name = bn(filename)
         key = bn(key_file)
         if enc_names:
+            # base64 pulls in re, so it is only loaded when needed
+            from base64 import urlsafe_b64encode
             encrypted = urlsafe_b64encode(
-                StreamCipher.xor(name.encode(), key.encode())
+                StreamCipher.xor(
+                    name.encode(),
+                    StreamCipher._name_key(key, len(name.encode()))
+                )
             ).decode()
             enc_file = f"{join(file_dir, encrypted)}.otp"
         else:
@@ -72,16 +811,438 @@ class StreamCipher:
             dec_file = bn(filename)[:-4].encode()
         else:
             dec_file = bn(filename).encode()
-        key = bn(key_file).encode()
+        key = bn(key_file)
+        from base64 import urlsafe_b64decode
+        from binascii import Error as BinasciiError
         try:
+            name = urlsafe_b64decode(dec_file)
             dec_file = StreamCipher.xor(
-                urlsafe_b64decode(dec_file), key
+                name, StreamCipher._name_key(key, len(name))
             ).decode()
-        except BinasciiError:
+        except (BinasciiError, UnicodeDecodeError):
+            # Names that were not encrypted may still be valid base64
             dec_file = dec_file.decode()
         dec_file = join(file_dir, dec_file)
         return dec_file
 
+    @staticmethod
+    def _encrypt_steps(
+        filename,
+        key_file,
+        file_dir="",
+        keys_dir="",
+        enc_names=False,
+        key_offset=None,
+        move_key=False,
+        chunk_size=CHUNK_SIZE,
+        backend="auto",
+        workers=1,
+        stats=None,
+        group=None
+    ):
+        """
+        Generator that writes the encrypted message and places the key
+        without touching the log or the source file, yielding the number of
+        bytes written so far and returning the encrypted filename and key
+        filename
+
+        A `key_offset` other than None means `key_file` is a shared pad and
+        the returned key filename is a reference to its segment.
+
+        The message is written to a temporary file that the sync group
+        `group` renames into place once it is durable, along with the key.
+        Without a group, both are made durable before returning. Closing
+        the generator early removes the temporary file.
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :param keys_dir: Keys directory
+        :type keys_dir: str
+        :param enc_names: Encrypt filenames option
+        :type enc_names: bool
+        :param key_offset: Offset of the pad segment
+        :type key_offset: int
+        :param move_key: Move rather than copy the key option
+        :type move_key: bool
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :param backend: XOR backend, see `xor_file`
+        :type backend: str
+        :param workers: Number of XOR worker processes, see `xor_file`
+        :type workers: int
+        :param stats: Statistics, see `encrypt_file`
+        :type stats: stats.Stats
+        :param group: Sync group
+        :type group: durable.SyncGroup
+        :return: Number of bytes written so far
+        :rtype: Iterator[int]
+        """
+        own = group is None
+        if own:
+            group = SyncGroup()
+        enc_filename, key_filename = StreamCipher.encrypt_filename(
+            filename, key_file, enc_names, file_dir, keys_dir
+        )
+        if key_offset is not None:
+            key_filename = key_ref(key_file, key_offset)
+        temp = temp_name(enc_filename)
+        try:
+            length = yield from StreamCipher._xor_counted(
+                filename,
+                key_file,
+                temp,
+                chunk_size,
+                backend,
+                workers,
+                key_offset or 0,
+                stats
+            )
+            if key_offset is None:
+                start = perf_counter()
+                StreamCipher._place_key(
+                    key_file, key_filename, length, move_key, chunk_size, group
+                )
+                if stats is not None:
+                    stats.add("key", perf_counter() - start)
+        except BaseException:
+            discard(temp)
+            raise
+        group.add(enc_filename, temp)
+        if own:
+            group.commit()
+        return enc_filename, key_filename
+
+    @staticmethod
+    def _encrypt(
+        filename,
+        key_file,
+        file_dir="",
+        keys_dir="",
+        enc_names=False,
+        key_offset=None,
+        move_key=False,
+        chunk_size=CHUNK_SIZE,
+        backend="auto",
+        workers=1,
+        progress=None,
+        cancel=None,
+        stats=None,
+        group=None
+    ):
+        """
+        Write the encrypted message and place the key without touching the
+        log or the source file, see `_encrypt_steps`
+        
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename
+        :type key_file: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :param keys_dir: Keys directory
+        :type keys_dir: str
+        :param enc_names: Encrypt filenames option
+        :type enc_names: bool
+        :param key_offset: Offset of the pad segment
+        :type key_offset: int
+        :param move_key: Move rather than copy the key option
+        :type move_key: bool
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :param backend: XOR backend, see `xor_file`
+        :type backend: str
+        :param workers: Number of XOR worker processes, see `xor_file`
+        :type workers: int
+        :param progress: Progress function, see `xor_file`
+        :type progress: Callable
+        :param cancel: Cancel event, see `xor_file`
+        :type cancel: threading.Event
+        :param stats: Statistics, see `encrypt_file`
+        :type stats: stats.Stats
+        :param group: Sync group
+        :type group: durable.SyncGroup
+        :return: Tuple of encrypted filename and key filename
+        :rtype: tuple
+        """
+        steps = StreamCipher._encrypt_steps(
+            filename,
+            key_file,
+            file_dir,
+            keys_dir,
+            enc_names,
+            key_offset,
+            move_key,
+            chunk_size,
+            backend,
+            workers,
+            stats,
+            group
+        )
+        return StreamCipher._drain(
+            steps, getsize(filename), progress, cancel
+        )
+
+    @staticmethod
+    def _create_new(filename):
+        """
+        Create the empty file `filename`, failing if it already exists
+
+        :param filename: Filename
+        :type filename: str
+        :raises FileExistsError: If `filename` exists
+        """
+        close(os_open(filename, O_WRONLY | O_CREAT | O_EXCL, 0o600))
+
+    @staticmethod
+    def _last_suffix(dec, ext):
+        """
+        Return the highest `i` of the existing files named `dec(i)ext`,
+        found with one scan of their directory
+
+        :param dec: Filename without extension
+        :type dec: str
+        :param ext: Extension
+        :type ext: str
+        :return: Highest suffix, or -1 if there is none
+        :rtype: int
+        """
+        prefix = f"{bn(dec)}("
+        suffix = f"){ext}"
+        last = -1
+        with scandir(dirname(dec) or ".") as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(prefix) and name.endswith(suffix):
+                    i = name[len(prefix):len(name) - len(suffix)]
+                    if i.isdigit():
+                        last = max(last, int(i))
+        return last
+
+    @staticmethod
+    def _claim_name(dec_file):
+        """
+        Create and return `dec_file`, or a name of the form `name(i).ext`
+        after the copies already there if it exists
+
+        Names are created with `O_CREAT | O_EXCL`, so concurrent decryptions
+        into one directory, in this or another process, never get the same
+        file. The next suffix is kept per name after the first scan of its
+        directory, and a name taken in the meantime moves on to the next.
+        Only the `SUFFIX_NAMES` names used last are kept, the others are
+        scanned for again.
+
+        :param dec_file: Decrypted filename
+        :type dec_file: str
+        :return: Created empty filename
+        :rtype: str
+        """
+        try:
+            StreamCipher._create_new(dec_file)
+            return dec_file
+        except FileExistsError:
+            pass
+        dec, ext = splitext(dec_file)
+        with _suffix_lock:
+            i = _suffixes.pop(dec_file, None)
+            if i is None:
+                i = StreamCipher._last_suffix(dec, ext) + 1
+            while True:
+                name = f"{dec}({i}){ext}"
+                try:
+                    StreamCipher._create_new(name)
+                except FileExistsError:
+                    i += 1
+                    continue
+                if len(_suffixes) >= SUFFIX_NAMES:
+                    # Dictionaries keep insertion order, so this is the
+                    # least recently used
+                    _suffixes.pop(next(iter(_suffixes)))
+                _suffixes[dec_file] = i + 1
+                return name
+
+    @staticmethod
+    def _decrypt_steps(
+        filename,
+        key_file,
+        file_dir="",
+        chunk_size=CHUNK_SIZE,
+        backend="auto",
+        workers=1,
+        stats=None,
+        group=None
+    ):
+        """
+        Generator that writes the decrypted message without touching the log
+        or the inputs, yielding the number of bytes written so far and
+        returning the decrypted filename
+
+        The message is written to a temporary file that the sync group
+        `group` renames over the claimed name once it is durable, see
+        `_claim_name`. Without a group, it is made durable before returning.
+        Closing the generator early removes the temporary file and releases
+        the claimed name.
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename or pad segment reference
+        :type key_file: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :param backend: XOR backend, see `xor_file`
+        :type backend: str
+        :param workers: Number of XOR worker processes, see `xor_file`
+        :type workers: int
+        :param stats: Statistics, see `decrypt_file`
+        :type stats: stats.Stats
+        :param group: Sync group
+        :type group: durable.SyncGroup
+        :return: Number of bytes written so far
+        :rtype: Iterator[int]
+        """
+        own = group is None
+        if own:
+            group = SyncGroup()
+        key_file, key_offset = parse_key_ref(key_file)
+        dec_file = StreamCipher._claim_name(
+            StreamCipher.decrypt_filename(filename, key_file, file_dir)
+        )
+        temp = temp_name(dec_file)
+        try:
+            yield from StreamCipher._xor_counted(
+                filename,
+                key_file,
+                temp,
+                chunk_size,
+                backend,
+                workers,
+                key_offset or 0,
+                stats
+            )
+        except BaseException:
+            # Release the claimed name
+            discard(temp)
+            discard(dec_file)
+            raise
+        group.add(dec_file, temp)
+        if own:
+            group.commit()
+        return dec_file
+
+    @staticmethod
+    def _decrypt(
+        filename,
+        key_file,
+        file_dir="",
+        chunk_size=CHUNK_SIZE,
+        backend="auto",
+        workers=1,
+        progress=None,
+        cancel=None,
+        stats=None,
+        group=None
+    ):
+        """
+        Write the decrypted message without touching the log or the inputs,
+        see `_decrypt_steps`
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename or pad segment reference
+        :type key_file: str
+        :param file_dir: File directory
+        :type file_dir: str
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :param backend: XOR backend, see `xor_file`
+        :type backend: str
+        :param workers: Number of XOR worker processes, see `xor_file`
+        :type workers: int
+        :param progress: Progress function, see `xor_file`
+        :type progress: Callable
+        :param cancel: Cancel event, see `xor_file`
+        :type cancel: threading.Event
+        :param stats: Statistics, see `decrypt_file`
+        :type stats: stats.Stats
+        :param group: Sync group
+        :type group: durable.SyncGroup
+        :return: Decrypted filename
+        :rtype: str
+        """
+        steps = StreamCipher._decrypt_steps(
+            filename,
+            key_file,
+            file_dir,
+            chunk_size,
+            backend,
+            workers,
+            stats,
+            group
+        )
+        return StreamCipher._drain(
+            steps, getsize(filename), progress, cancel
+        )
+
+    @staticmethod
+    def _remove_inputs(filename, key_file):
+        """
+        Delete an encrypted file and its key, unless the key is a segment of
+        a shared pad
+        
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename or pad segment reference
+        :type key_file: str
+        """
+        remove(filename)
+        key_file, key_offset = parse_key_ref(key_file)
+        if key_offset is None:
+            remove(key_file)
+
+    @staticmethod
+    def read_log(log_dir=""):
+        """
+        Return the entries of the log in `log_dir` as tuples of filename,
+        encrypted filename, key filename and time
+        
+        :param log_dir: Log directory
+        :type log_dir: str
+        :return: List of log entries
+        :rtype: list
+        """
+        return LogStore(log_dir).entries()
+
+    @staticmethod
+    def _append_log(log_dir, entries):
+        """
+        Append tuples of filename, encrypted filename and key filename
+        `entries` to the log in `log_dir` in a single transaction
+        
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param entries: Log entries
+        :type entries: list
+        """
+        LogStore(log_dir).append(entries)
+
+    @staticmethod
+    def _remove_log_entries(log_dir, filenames):
+        """
+        Remove the entries of the encrypted files `filenames` from the log in
+        `log_dir` in a single transaction
+        
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param filenames: Encrypted filenames
+        :type filenames: list
+        """
+        LogStore(log_dir).remove(filenames)
+
     @staticmethod
     def encrypt_file(
         filename,
@@ -90,11 +1251,40 @@ class StreamCipher:
         keys_dir="",
         log_dir="",
         enc_names=False,
-        del_toggle=False
+        del_toggle=False,
+        chunk_size=CHUNK_SIZE,
+        backend="auto",
+        workers=1,
+        pad=False,
+        pool=None,
+        move_key=False,
+        progress=None,
+        cancel=None,
+        stats=None
     ):
         """
         Given a filename, writes the encrypted message and corresponding key to
         separate files
+
+        If `pad` is set, `key_file` is a shared pad instead. The next unused
+        segment of the pad is allocated for the message, no key file is
+        written and the returned key filename is a reference to the segment
+        (see `pad.key_ref`).
+
+        If `key_file` is None, a key of sufficient size is claimed from the
+        key pool `pool` instead. A key shorter than the message is refused
+        before anything is written.
+
+        Only the part of the key used for the message is kept in `keys_dir`.
+        With `move_key` the key is moved there rather than copied.
+
+        A cancelled encryption leaves no output and no log entry behind,
+        see `xor_file`. The encrypted file and key are written under
+        temporary names and renamed into place once flushed to disk, and
+        the source is only deleted after that (see `durable.SyncGroup`).
+
+        The bytes encrypted, the total time and the time spent in each
+        phase are recorded in `stats` (see `stats.Stats`).
         
         :param filename: Filename
         :type filename: str
@@ -110,36 +1300,138 @@ class StreamCipher:
         :type enc_names: bool
         :param del_toggle: Delete files option
         :type del_toggle: bool
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :param backend: XOR backend, see `xor_file`
+        :type backend: str
+        :param workers: Number of XOR worker processes, see `xor_file`
+        :type workers: int
+        :param pad: Shared pad option
+        :type pad: bool
+        :param pool: Key pool
+        :type pool: key_pool.KeyPool
+        :param move_key: Move rather than copy the key option
+        :type move_key: bool
+        :param progress: Progress function, see `xor_file`
+        :type progress: Callable
+        :param cancel: Cancel event, see `xor_file`
+        :type cancel: threading.Event
+        :param stats: Statistics
+        :type stats: stats.Stats
         :return: Tuple of encrypted filename and key filename
         :rtype: tuple
+        :raises ValueError: If the key or the unused part of the pad is
+            shorter than the message
         """
-        msg = open(filename, "rb").read()
-        key = open(key_file, "rb").read()
-        encrypted = StreamCipher.xor(msg, key)
-        enc_filename, key_filename = StreamCipher.encrypt_filename(
-            filename, key_file, enc_names, file_dir, keys_dir
+        if stats is None:
+            stats = Stats()
+        stats.start()
+        key_file, key_offset = StreamCipher._take_key(
+            filename, key_file, log_dir, pad, pool
         )
+        group = SyncGroup()
+        enc_filename, key_filename = StreamCipher._encrypt(
+            filename,
+            key_file,
+            file_dir,
+            keys_dir,
+            enc_names,
+            key_offset,
+            move_key,
+            chunk_size,
+            backend,
+            workers,
+            progress,
+            cancel,
+            stats,
+            group
+        )
+        StreamCipher._commit_encrypt(
+            filename,
+            enc_filename,
+            key_filename,
+            log_dir,
+            del_toggle,
+            group,
+            stats
+        )
+        stats.stop()
+        return enc_filename, key_filename
 
-        # Write to files
-        with open(enc_filename, "wb") as e:
-            e.write(encrypted)
-            e.close()
-        with open(key_filename, "wb") as k:
-            k.write(key)
-            k.close()
-        log = f"{filename}\n{enc_filename}\n{key_filename}\n{ctime(time())}\n\n"
-        log_file = join(log_dir, "otp.log")
-        try:
-            with open(log_file, "a") as logfile:
-                logfile.write(log)
-                logfile.close()
-        except FileNotFoundError:
-            with open(log_file, "w") as logfile:
-                logfile.write(log)
-                logfile.close()
+    @staticmethod
+    def _take_key(filename, key_file, log_dir="", pad=False, pool=None):
+        """
+        Return the key file for encrypting `filename` and the offset of its
+        pad segment, see `encrypt_file`
+
+        A key shorter than the message would only encrypt part of it, so it
+        is refused before anything is written.
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename, shared pad filename, or None
+        :type key_file: str
+        :param log_dir: Log directory, which holds the pad state
+        :type log_dir: str
+        :param pad: Shared pad option
+        :type pad: bool
+        :param pool: Key pool
+        :type pool: key_pool.KeyPool
+        :return: Tuple of key filename and segment offset, or None for a
+            plain key
+        :rtype: tuple
+        :raises ValueError: If the key is shorter than the message
+        """
+        size = getsize(filename)
+        if key_file is None:
+            key_file = pool.claim(size)
+        if pad:
+            return key_file, Pad(key_file, log_dir).allocate(size)
+        if getsize(key_file) < size:
+            raise ValueError(f"Key is shorter than the {size} bytes needed")
+        return key_file, None
+
+    @staticmethod
+    def _commit_encrypt(
+        filename,
+        enc_filename,
+        key_filename,
+        log_dir="",
+        del_toggle=False,
+        group=None,
+        stats=None
+    ):
+        """
+        Make the outputs of an encryption durable, log it, then delete the
+        source if `del_toggle` is set
+
+        :param filename: Filename
+        :type filename: str
+        :param enc_filename: Encrypted filename
+        :type enc_filename: str
+        :param key_filename: Key filename or pad segment reference
+        :type key_filename: str
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param del_toggle: Delete files option
+        :type del_toggle: bool
+        :param group: Sync group holding the outputs
+        :type group: durable.SyncGroup
+        :param stats: Statistics
+        :type stats: stats.Stats
+        """
+        if stats is None:
+            stats = Stats()
+        start = perf_counter()
+        group.commit()
+        stats.add("sync", perf_counter() - start)
+        start = perf_counter()
+        StreamCipher._append_log(
+            log_dir, [(filename, enc_filename, key_filename)]
+        )
+        stats.add("log", perf_counter() - start)
         if del_toggle:
             remove(filename)
-        return enc_filename, key_filename
 
     @staticmethod
     def decrypt_file(
@@ -147,11 +1439,29 @@ class StreamCipher:
         key_file,
         file_dir="",
         log_dir="",
-        del_toggle=False
+        del_toggle=False,
+        chunk_size=CHUNK_SIZE,
+        backend="auto",
+        workers=1,
+        progress=None,
+        cancel=None,
+        stats=None
     ):
         """
         Given a file and key file, reads the encrypted message from file using
         the key from key_file
+
+        `key_file` may also be a pad segment reference returned by
+        `encrypt_file`, in which case the pad is read from the referenced
+        offset and is never deleted.
+
+        A cancelled decryption leaves no output behind and the inputs in
+        place, see `xor_file`. The decrypted file is written under a
+        temporary name and renamed into place once flushed to disk, and the
+        inputs are only deleted after that (see `durable.SyncGroup`).
+
+        The bytes decrypted, the total time and the time spent in each
+        phase are recorded in `stats` (see `stats.Stats`).
         
         :param filename: Filename
         :type filename: str
@@ -163,42 +1473,300 @@ class StreamCipher:
         :type log_dir: str
         :param del_toggle: Delete files option
         :type del_toggle: bool
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :param backend: XOR backend, see `xor_file`
+        :type backend: str
+        :param workers: Number of XOR worker processes, see `xor_file`
+        :type workers: int
+        :param progress: Progress function, see `xor_file`
+        :type progress: Callable
+        :param cancel: Cancel event, see `xor_file`
+        :type cancel: threading.Event
+        :param stats: Statistics
+        :type stats: stats.Stats
         :return: Decrypted filename
         :rtype: str
         """
-        msg = open(filename, "rb").read()
-        key = open(key_file, "rb").read()
-        decrypted = StreamCipher.xor(msg, key)
-        dec_file = StreamCipher.decrypt_filename(filename, key_file, file_dir)
-        if del_toggle:
-            remove(filename)
-            remove(key_file)
-            try:
-                log_file = join(log_dir, "otp.log")
-                old_log = open(log_file, "r").readlines()
-                files = [bn(line[:-1]) for line in old_log]
-                # Find the index of the filename
-                ind = files.index(bn(filename)) - 1
-                # Designate the indices of the lines to be removed i.e. the
-                # file and the four lines immediately following it
-                rmv = []
-                for i in range(5):
-                    rmv.append(ind + i)
-                # Updated log contains everything but the removed item
-                new_log = [j for i, j in enumerate(old_log) if i not in rmv]
-                with open(log_file, "w") as logfile:
-                    for line in new_log:
-                        logfile.write(line)
-                    logfile.close()
-            except ValueError:
-                pass
-        dec, ext = splitext(dec_file)
-        if exists(f"{dec}{ext}"):
-            i = 0
-            while exists(f"{dec}({str(i)}){ext}"):
-                i += 1
-            dec_file = f"{dec}({str(i)}){ext}"
-        with open(dec_file, "wb") as d:
-            d.write(decrypted)
-            d.close()
+        if stats is None:
+            stats = Stats()
+        stats.start()
+        group = SyncGroup()
+        dec_file = StreamCipher._decrypt(
+            filename,
+            key_file,
+            file_dir,
+            chunk_size,
+            backend,
+            workers,
+            progress,
+            cancel,
+            stats,
+            group
+        )
+        StreamCipher._commit_decrypt(
+            filename, key_file, log_dir, del_toggle, group, stats
+        )
+        stats.stop()
         return dec_file
+
+    @staticmethod
+    def _commit_decrypt(
+        filename,
+        key_file,
+        log_dir="",
+        del_toggle=False,
+        group=None,
+        stats=None
+    ):
+        """
+        Make the output of a decryption durable, then delete the inputs and
+        their log entry if `del_toggle` is set
+
+        :param filename: Filename
+        :type filename: str
+        :param key_file: Key filename or pad segment reference
+        :type key_file: str
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param del_toggle: Delete files option
+        :type del_toggle: bool
+        :param group: Sync group holding the output
+        :type group: durable.SyncGroup
+        :param stats: Statistics
+        :type stats: stats.Stats
+        """
+        if stats is None:
+            stats = Stats()
+        start = perf_counter()
+        group.commit()
+        stats.add("sync", perf_counter() - start)
+        # The inputs are only removed once the output has been written
+        if del_toggle:
+            StreamCipher._remove_inputs(filename, key_file)
+            start = perf_counter()
+            StreamCipher._remove_log_entries(log_dir, [filename])
+            stats.add("log", perf_counter() - start)
+
+    @staticmethod
+    def _walk(src_dir, file_dir, ext=""):
+        """
+        Return every file below `src_dir` ending in `ext` along with the
+        directory below `file_dir` that mirrors its own, creating those
+        directories
+        
+        :param src_dir: Source directory
+        :type src_dir: str
+        :param file_dir: Output directory
+        :type file_dir: str
+        :param ext: Filename extension
+        :type ext: str
+        :return: List of tuples of filename and output directory
+        :rtype: list
+        """
+        jobs = []
+        for root, dirs, files in walk(src_dir):
+            out_dir = normpath(join(file_dir, relpath(root, src_dir)))
+            files = [f for f in sorted(files) if f.endswith(ext)]
+            if files:
+                makedirs(out_dir, exist_ok=True)
+            jobs += [(join(root, f), out_dir) for f in files]
+        return jobs
+
+    @staticmethod
+    def _run_jobs(job, jobs, threads):
+        """
+        Run `job` on every item of `jobs` in a pool of `threads` threads and
+        sort the outcomes into results and errors
+        
+        :param job: Function called with the index of a job
+        :type job: Callable[[int], tuple]
+        :param jobs: List of tuples of filename and output directory
+        :type jobs: list
+        :param threads: Number of threads
+        :type threads: int
+        :return: Tuple of results by index and errors
+        :rtype: tuple
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        results = {}
+        errors = []
+        with ThreadPoolExecutor(threads) as pool:
+            futures = [pool.submit(job, i) for i in range(len(jobs))]
+            for i, future in enumerate(futures):
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    errors.append((jobs[i][0], str(e)))
+        return results, errors
+
+    @staticmethod
+    def encrypt_tree(
+        src_dir,
+        file_dir,
+        keys_dir="",
+        log_dir="",
+        enc_names=False,
+        del_toggle=False,
+        pad_file=None,
+        pool=None,
+        threads=4,
+        chunk_size=CHUNK_SIZE,
+        sync_every=SYNC_GROUP
+    ):
+        """
+        Encrypt every file below `src_dir` into the same layout below
+        `file_dir`, running the files on a pool of `threads` threads
+
+        Each file is paired with a segment of the shared pad `pad_file`,
+        allocated for the whole batch at once, or with a key claimed from
+        `pool`, or with a newly generated key. A file that fails is
+        reported and does not stop the others.
+
+        Outputs are made durable in group commits of `sync_every` files
+        (see `durable.SyncGroup`). The log is appended to once the last
+        group is durable, and sources are only deleted after that.
+        
+        :param src_dir: Source directory
+        :type src_dir: str
+        :param file_dir: Output directory
+        :type file_dir: str
+        :param keys_dir: Keys directory
+        :type keys_dir: str
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param enc_names: Encrypt filenames option
+        :type enc_names: bool
+        :param del_toggle: Delete files option
+        :type del_toggle: bool
+        :param pad_file: Shared pad filename
+        :type pad_file: str
+        :param pool: Key pool
+        :type pool: key_pool.KeyPool
+        :param threads: Number of threads
+        :type threads: int
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :param sync_every: Number of files per group commit
+        :type sync_every: int
+        :return: Report of files, bytes, seconds, entries and errors
+        :rtype: dict
+        """
+        from .keygen import KeyGen
+        start = perf_counter()
+        group = SyncGroup(sync_every)
+        jobs = StreamCipher._walk(src_dir, file_dir)
+        sizes = [getsize(filename) for filename, _ in jobs]
+        offsets = []
+        if pad_file is not None:
+            offset = Pad(pad_file, log_dir).allocate(sum(sizes))
+            for size in sizes:
+                offsets.append(offset)
+                offset += size
+
+        def job(i):
+            filename, out_dir = jobs[i]
+            key_offset = None
+            if pad_file is not None:
+                key_file = pad_file
+                key_offset = offsets[i]
+            elif pool is not None:
+                key_file = pool.claim(sizes[i])
+            else:
+                key_file = KeyGen.generate(sizes[i], keys_dir, workers=1)
+            return StreamCipher._encrypt(
+                filename,
+                key_file,
+                out_dir,
+                keys_dir,
+                enc_names,
+                key_offset,
+                chunk_size=chunk_size,
+                group=group
+            )
+
+        results, errors = StreamCipher._run_jobs(job, jobs, threads)
+        group.commit()
+        entries = [(jobs[i][0],) + results[i] for i in sorted(results)]
+        StreamCipher._append_log(log_dir, entries)
+        if del_toggle:
+            for entry in entries:
+                remove(entry[0])
+        return {
+            "files": len(entries),
+            "bytes": sum(sizes[i] for i in results),
+            "seconds": perf_counter() - start,
+            "entries": entries,
+            "errors": errors
+        }
+
+    @staticmethod
+    def decrypt_tree(
+        src_dir,
+        file_dir,
+        log_dir="",
+        del_toggle=False,
+        threads=4,
+        chunk_size=CHUNK_SIZE,
+        sync_every=SYNC_GROUP
+    ):
+        """
+        Decrypt every .otp file below `src_dir` into the same layout below
+        `file_dir`, running the files on a pool of `threads` threads
+
+        Keys are looked up in the log over one connection by the path of
+        each file, and the log is written to at most once. A file that
+        fails, including one with no entry for its own path, is reported
+        and does not stop the others.
+
+        Outputs are made durable in group commits of `sync_every` files
+        (see `durable.SyncGroup`), and inputs are only deleted once the last
+        group is durable.
+        
+        :param src_dir: Source directory
+        :type src_dir: str
+        :param file_dir: Output directory
+        :type file_dir: str
+        :param log_dir: Log directory
+        :type log_dir: str
+        :param del_toggle: Delete files option
+        :type del_toggle: bool
+        :param threads: Number of threads
+        :type threads: int
+        :param chunk_size: Number of bytes read from each file at a time
+        :type chunk_size: int
+        :param sync_every: Number of files per group commit
+        :type sync_every: int
+        :return: Report of files, bytes, seconds, entries and errors
+        :rtype: dict
+        """
+        start = perf_counter()
+        group = SyncGroup(sync_every)
+        jobs = StreamCipher._walk(src_dir, file_dir, ".otp")
+        found = LogStore(log_dir).find_all([f for f, _ in jobs])
+
+        def job(i):
+            filename, out_dir = jobs[i]
+            if filename not in found:
+                raise KeyError(f"No log entry for {bn(filename)}")
+            key_file = found[filename][2]
+            dec_file = StreamCipher._decrypt(
+                filename, key_file, out_dir, chunk_size, group=group
+            )
+            # The output is only renamed into place by the group commit
+            return key_file, dec_file, getsize(filename)
+
+        results, errors = StreamCipher._run_jobs(job, jobs, threads)
+        group.commit()
+        entries = [(jobs[i][0],) + results[i][:2] for i in sorted(results)]
+        if del_toggle:
+            for filename, key_file, _ in entries:
+                StreamCipher._remove_inputs(filename, key_file)
+            StreamCipher._remove_log_entries(log_dir, [e[0] for e in entries])
+        return {
+            "files": len(entries),
+            "bytes": sum(results[i][2] for i in results),
+            "seconds": perf_counter() - start,
+            "entries": entries,
+            "errors": errors
+        }
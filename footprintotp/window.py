@@ -1,13 +1,14 @@
 from os.path import join
 from platform import system
-from json import loads
 from gi import require_versions
 require_versions({"Gtk": "4.0", "Adw": "1"})
 from gi.repository import Gtk, Gio
 from . import *
 from .about import About
+from .config import settings
 from .preferences import Preferences
 from .file_log import FileLog
+from .profiles import Profiles
 from .encrypt import Encrypt
 from .decrypt import Decrypt
 
@@ -51,6 +52,9 @@ class Window(Gtk.ApplicationWindow):
         action = Gio.SimpleAction.new("log", None)
         action.connect("activate", self.on_log_clicked)
         app.add_action(action)
+        action = Gio.SimpleAction.new("profiles", None)
+        action.connect("activate", self.on_profiles_clicked)
+        app.add_action(action)
         action = Gio.SimpleAction.new("about", None)
         action.connect("activate", self.on_about_clicked)
         app.add_action(action)
@@ -130,6 +134,18 @@ class Window(Gtk.ApplicationWindow):
         win = FileLog(self)
         win.show()
 
+    def on_profiles_clicked(self, action, param):
+        """
+        Open profiles window
+        
+        :param action: Action
+        :type action: Gio.SimpleAction
+        :param param: Parameter
+        :type param: NoneType
+        """
+        win = Profiles(self)
+        win.show()
+
     def on_about_clicked(self, action, param):
         """
         Open about dialog window
@@ -149,21 +165,18 @@ class Window(Gtk.ApplicationWindow):
         :param widget: Widget
         :type widget: Gtk.Widget
         """
-        config = loads(open(join(CONF, "settings.json"), "r").read())
-
         # Reset encrypt options
         self.encrypt.file.set_text("")
         self.encrypt.key.set_text("")
-        self.encrypt.dir.set_text(config["save"])
+        self.encrypt.dir.set_text(settings["save"])
         self.encrypt.del_toggle.set_active(False)
-        self.encrypt.config = config
+        self.encrypt.pad_toggle.set_active(False)
 
         # Reset decrypt options
         self.decrypt.file.set_text("")
         self.decrypt.key.set_text("")
-        self.decrypt.dir.set_text(config["save"])
+        self.decrypt.dir.set_text(settings["save"])
         self.decrypt.del_toggle.set_active(True)
-        self.decrypt.config = config
 
     def quit(self):
         """
@@ -0,0 +1,52 @@
+from os import makedirs, rename, urandom
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase, main
+from footprintotp.pad import Pad, parse_key_ref
+
+
+class TestPad(TestCase):
+    """
+    Tests of `Pad` and `parse_key_ref`
+    """
+    def setUp(self):
+        """
+        Create a pad and a state directory
+        """
+        self.tmp = mkdtemp()
+        self.state = join(self.tmp, "state")
+        makedirs(self.state)
+        self.pad_file = join(self.tmp, "pad.bin")
+        with open(self.pad_file, "wb") as f:
+            f.write(urandom(1 << 16))
+
+    def tearDown(self):
+        """
+        Remove the temporary directory
+        """
+        rmtree(self.tmp)
+
+    def test_moved_pad(self):
+        """
+        A moved pad keeps its used region, so no byte is handed out twice
+        """
+        self.assertEqual(Pad(self.pad_file, self.state).allocate(100), 0)
+        moved = join(self.tmp, "moved.bin")
+        rename(self.pad_file, moved)
+        self.assertEqual(Pad(moved, self.state).allocate(100), 100)
+
+    def test_missing_key_with_at(self):
+        """
+        A missing key file whose name looks like a reference is not read as
+        one, while a segment of an existing pad is
+        """
+        missing = join(self.tmp, "notes@123")
+        self.assertEqual(parse_key_ref(missing), (missing, None))
+        self.assertEqual(
+            parse_key_ref(f"{self.pad_file}@123"), (self.pad_file, 123)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+from os import chdir, getcwd, makedirs, walk
+from os.path import join, exists
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase, main
+from footprintotp.log_store import LogStore
+from footprintotp.stream_cipher import StreamCipher
+
+
+class TestDecryptTree(TestCase):
+    """
+    Tests of `StreamCipher.decrypt_tree`
+    """
+    def setUp(self):
+        """
+        Create a source tree, holding files of the same name in different
+        directories, along with the output, keys and log directories
+        """
+        self.tmp = mkdtemp()
+        self.src = join(self.tmp, "src")
+        self.enc = join(self.tmp, "enc")
+        self.dec = join(self.tmp, "dec")
+        self.keys = join(self.tmp, "keys")
+        self.log = join(self.tmp, "log")
+        self.messages = {"a": b"first message", "b": b"second message"}
+        for d, message in self.messages.items():
+            makedirs(join(self.src, d))
+            with open(join(self.src, d, "readme.txt"), "wb") as f:
+                f.write(message)
+        for d in (self.enc, self.dec, self.keys, self.log):
+            makedirs(d)
+
+    def tearDown(self):
+        """
+        Remove the temporary directory
+        """
+        rmtree(self.tmp)
+
+    def _encrypt(self):
+        """
+        Encrypt the source tree, deleting the sources
+
+        :return: Report of `encrypt_tree`
+        :rtype: dict
+        """
+        report = StreamCipher.encrypt_tree(
+            self.src, self.enc, self.keys, self.log, del_toggle=True
+        )
+        self.assertEqual(report["errors"], [])
+        return report
+
+    def test_duplicate_names(self):
+        """
+        Files of the same name in different directories are decrypted with
+        their own keys, and deleting the inputs removes only their own
+        """
+        self._encrypt()
+        report = StreamCipher.decrypt_tree(
+            self.enc, self.dec, self.log, del_toggle=True
+        )
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(report["files"], 2)
+        for d, message in self.messages.items():
+            with open(join(self.dec, d, "readme.txt"), "rb") as f:
+                self.assertEqual(f.read(), message)
+        self.assertEqual([f for _, _, f in walk(self.enc) if f], [])
+        self.assertEqual(LogStore(self.log).entries(), [])
+
+    def test_moved_file(self):
+        """
+        A file whose name has log entries, none of which is its own path,
+        fails and is left in place
+        """
+        self._encrypt()
+        moved = join(self.tmp, "moved")
+        makedirs(moved)
+        with open(join(self.enc, "a", "readme.txt.otp"), "rb") as f:
+            data = f.read()
+        with open(join(moved, "readme.txt.otp"), "wb") as f:
+            f.write(data)
+        report = StreamCipher.decrypt_tree(
+            moved, self.dec, self.log, del_toggle=True
+        )
+        self.assertEqual(report["files"], 0)
+        self.assertEqual(len(report["errors"]), 1)
+        self.assertTrue(exists(join(moved, "readme.txt.otp")))
+        self.assertEqual(len(LogStore(self.log).entries()), 2)
+
+
+class TestRelativePaths(TestCase):
+    """
+    Tests of files encrypted and decrypted through relative paths
+    """
+    def setUp(self):
+        """
+        Create two directories holding a file of the same name
+        """
+        self.cwd = getcwd()
+        self.tmp = mkdtemp()
+        self.log = join(self.tmp, "log")
+        makedirs(self.log)
+        self.messages = {"ra": b"first message", "rb": b"second message"}
+        for d, message in self.messages.items():
+            makedirs(join(self.tmp, d, "keys"))
+            with open(join(self.tmp, d, "x.txt"), "wb") as f:
+                f.write(message)
+
+    def tearDown(self):
+        """
+        Go back to the original directory and remove the temporary one
+        """
+        chdir(self.cwd)
+        rmtree(self.tmp)
+
+    def test_same_name_in_two_directories(self):
+        """
+        Decrypting by relative path finds the key of the file in the current
+        directory, and deleting the inputs leaves the other file alone
+        """
+        for d, message in self.messages.items():
+            chdir(join(self.tmp, d))
+            with open("key", "wb") as f:
+                f.write(bytes(range(len(message))))
+            StreamCipher.encrypt_file(
+                "x.txt", "key", "", "keys", self.log, del_toggle=True
+            )
+        chdir(join(self.tmp, "ra"))
+        entry = LogStore(self.log).find("x.txt.otp")
+        self.assertEqual(entry[1], join(self.tmp, "ra", "x.txt.otp"))
+        dec = StreamCipher.decrypt_file(
+            "x.txt.otp", entry[2], "", self.log, del_toggle=True
+        )
+        with open(dec, "rb") as f:
+            self.assertEqual(f.read(), self.messages["ra"])
+        self.assertTrue(exists(join(self.tmp, "rb", "x.txt.otp")))
+        self.assertTrue(exists(join(self.tmp, "rb", "keys", "key")))
+        entries = LogStore(self.log).entries()
+        self.assertEqual(
+            [e[1] for e in entries], [join(self.tmp, "rb", "x.txt.otp")]
+        )
+
+
+class TestLongNames(TestCase):
+    """
+    Tests of files whose names are close to the longest allowed
+    """
+    def setUp(self):
+        """
+        Create a file with a 250 character name and a key for it
+        """
+        self.tmp = mkdtemp()
+        self.message = b"long name message"
+        self.filename = join(self.tmp, "n" * 250)
+        with open(self.filename, "wb") as f:
+            f.write(self.message)
+        self.key = join(self.tmp, "key")
+        with open(self.key, "wb") as f:
+            f.write(bytes(len(self.message)))
+
+    def tearDown(self):
+        """
+        Remove the temporary directory
+        """
+        rmtree(self.tmp)
+
+    def test_round_trip(self):
+        """
+        The temporary files of the outputs fit in the longest name allowed
+        """
+        out = join(self.tmp, "out")
+        makedirs(out)
+        enc, key = StreamCipher.encrypt_file(
+            self.filename, self.key, self.tmp, out, self.tmp, del_toggle=True
+        )
+        dec = StreamCipher.decrypt_file(enc, key, self.tmp, self.tmp)
+        self.assertEqual(dec, self.filename)
+        with open(dec, "rb") as f:
+            self.assertEqual(f.read(), self.message)
+
+
+if __name__ == "__main__":
+    main()